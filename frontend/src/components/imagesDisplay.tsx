@@ -1,12 +1,20 @@
 import Image from 'next/image';
 import { useConversationStore } from '@/libs/zustand/conversation';
 import { Button } from '@/components/ui/button';
+import { fullImageUrl } from '@/libs/backendPost';
+import { Image as ImageData } from '@/types';
 
 const WIDTH = 320;
 const HEIGHT = 180;
 export const defaultImage =
   'https://static.wikia.nocookie.net/virtualyoutuber/images/e/e5/Gremlin_Chibidoki_PNG.png/revision/latest?cb=20250311221031';
 
+// The grid only needs the thumbnail; full resolution is loaded on click
+const thumbnailSrc = (image: ImageData) =>
+  image.thumbnail_base64
+    ? `data:${image.thumbnail_mime_type ?? 'image/webp'};base64,${image.thumbnail_base64}`
+    : `data:${image.mime_type ?? 'image/png'};base64,${image.base64}`;
+
 export const ImagesDisplay = () => {
   const { imagesStored } = useConversationStore();
 
@@ -20,10 +28,15 @@ export const ImagesDisplay = () => {
         <div key={idx}>
           <Image
             className="transform -scale-x-100"
-            src={`data:image/png;base64,${image.base64}`}
+            src={thumbnailSrc(image)}
             width={WIDTH}
             height={HEIGHT}
             alt="image"
+            onClick={() => {
+              if (image.image_id) {
+                window.open(fullImageUrl(image.image_id), '_blank');
+              }
+            }}
             onError={(e) => {
               e.currentTarget.src = defaultImage;
             }}
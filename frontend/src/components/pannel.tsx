@@ -4,7 +4,7 @@ import { Conversation } from '@/components/conversation';
 import { useConversationStore } from '@/libs/zustand/conversation';
 import { Roles } from '@/constants';
 import { useInputStore } from '@/libs/zustand/input';
-import { useCallback, useState } from 'react';
+import { useCallback, useRef, useState } from 'react';
 import { ImagesDisplay } from '@/components/imagesDisplay';
 import { Headline } from '@/components/headline';
 import { backendPost } from '@/libs/backendPost';
@@ -15,19 +15,41 @@ const subtennatilityScore = () => {
 };
 
 export const Pannel = () => {
-  const { addMessages, addImagesStored } = useConversationStore();
+  const { addMessages, addImagesStored, sessionId, setSessionId } =
+    useConversationStore();
   const { text, setText, images } = useInputStore();
   const [isLoading, setIsLoading] = useState(false);
+  // Last photo the session has seen; a new camera frame is sent again
+  const sentImage = useRef<string | null>(null);
 
   const handleSend = useCallback(
     async (e: React.FormEvent<HTMLFormElement>) => {
       e.preventDefault();
-      if (text.trim().length === 0 || images.length === 0 || !images[0]) {
+      // The photo is only required to start a conversation
+      if (text.trim().length === 0 || (!sessionId && !images[0])) {
         return;
       }
       setIsLoading(true);
       addMessages([{ role: Roles.USER, content: text }]);
-      const response = await backendPost({ text, imageBase64: images[0] });
+      const image = images[0];
+      let response = await backendPost({
+        text,
+        imageBase64:
+          sessionId && image === sentImage.current ? undefined : image,
+        sessionId,
+      });
+      if (response.session_expired) {
+        // Start a new session with the current photo
+        setSessionId(null);
+        sentImage.current = null;
+        if (image) {
+          response = await backendPost({ text, imageBase64: image });
+        }
+      }
+      if (response.session_id) {
+        setSessionId(response.session_id);
+        sentImage.current = image ?? sentImage.current;
+      }
       if (!response.success) {
         addMessages([
           {
@@ -55,7 +77,15 @@ export const Pannel = () => {
       setText('');
       setIsLoading(false);
     },
-    [addMessages, text, setText, images, addImagesStored],
+    [
+      addMessages,
+      text,
+      setText,
+      images,
+      addImagesStored,
+      sessionId,
+      setSessionId,
+    ],
   );
 
   return (
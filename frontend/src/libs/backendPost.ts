@@ -2,20 +2,44 @@ import { backendPostResponse } from '@/types';
 
 const base = process.env.NEXT_PUBLIC_BASE_URL!;
 
+export const fullImageUrl = (imageId: string) => `${base}/images/${imageId}`;
+
 interface backendPostProps {
   text: string;
-  imageBase64: string;
+  // Required to start a conversation; without it follow-ups reuse the session's photo
+  imageBase64?: string;
+  sessionId?: string | null;
 }
 
-export const backendPost = async ({ text, imageBase64 }: backendPostProps) => {
+export const backendPost = async ({
+  text,
+  imageBase64,
+  sessionId,
+}: backendPostProps): Promise<backendPostResponse> => {
   try {
     const response = await fetch(`${base}/fashion-workflow`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ user_input: text, base64_image: imageBase64 }),
+      // Thumbnails come inline, full-size images are fetched on demand
+      body: JSON.stringify({
+        user_input: text,
+        base64_image: imageBase64,
+        session_id: sessionId,
+        thumbnails_only: true,
+      }),
     });
+    // 404: unknown or expired session, 410: its photo expired
+    if (sessionId && (response.status === 404 || response.status === 410)) {
+      return {
+        text: 'Session expired',
+        images: [],
+        success: false,
+        error_message: 'Your session expired, please send a photo to start again',
+        session_expired: true,
+      };
+    }
     if (!response.ok) {
       throw new Error('Failed to fetch');
     }
@@ -64,6 +64,9 @@ interface ConversationState {
   imagesStored: Image[];
   addImagesStored: (images: Image[]) => void;
   removeAllMessages: () => void;
+  // Server-side session of this conversation, see /fashion-workflow
+  sessionId: string | null;
+  setSessionId: (sessionId: string | null) => void;
 }
 
 export const useConversationStore = create<ConversationState>((set) => ({
@@ -79,5 +82,7 @@ export const useConversationStore = create<ConversationState>((set) => ({
     set((state: { conversation: Msg[] }) => ({
       conversation: [...state.conversation, ...messages],
     })),
-  removeAllMessages: () => set({ conversation: [] }),
+  removeAllMessages: () => set({ conversation: [], sessionId: null }),
+  sessionId: null,
+  setSessionId: (sessionId: string | null) => set({ sessionId }),
 }));
@@ -1,6 +1,10 @@
 export interface Image {
   base64?: string;
   description?: string;
+  mime_type?: string;
+  image_id?: string | null;
+  thumbnail_base64?: string | null;
+  thumbnail_mime_type?: string | null;
   subtennatilityScore?: number;
 }
 
@@ -9,4 +13,7 @@ export interface backendPostResponse {
   images: Image[];
   success: boolean;
   error_message: string | null;
+  session_id?: string | null;
+  // The session (or its photo) has expired on the server
+  session_expired?: boolean;
 }
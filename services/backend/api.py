@@ -1,24 +1,130 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import base64
+import logging
+import math
+import secrets
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 import uvicorn
-import base64
 
 from models import FashionResponse
-from core.fashion_workflow import fashion_workflow
-from core.fashion_workflow_fallback import fashion_workflow_fallback
+from responses import FastJSONResponse
+from settings import (
+    ADMIN_API_KEY,
+    BATCH_CONCURRENCY,
+    BATCH_DIR,
+    BATCH_WEIGHT,
+    DEFAULT_OUTFIT_COUNT,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    MAX_OUTFIT_COUNT,
+    PROFILE_MEMORY,
+)
+from core import accounting
+from core.adaptive import edit_resolution, intent_resolution
+from core.batch import BatchRunner, directory_items, load_stats, read_manifest
+from core.coalesce import request_coalescer
+from core.dedup import near_duplicates
+from core.disk_cache import cache_key, disk_cache
+from core.image_payload import RequestImage
+from core.image_store import image_store
+from core.lifecycle import inflight_jobs
+from core.logs import RequestIdMiddleware, configure_logging
+from core.outfit_parser import validate_outfit_prompt
+from core.profiling import memory_profile
+from core.quality import DEFAULT_QUALITY
+from core.rate_limit import identify_client, rate_limiter
+from core.scheduler import QueueFullError, job_scheduler
+from core.semantic_cache import outfit_prompt_cache
+from core.sessions import session_outfit, session_store
+from core.fashion_workflow import fashion_workflow, intent_batchers
+
+# JSON lines written by a background thread, see core/logs.py
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 # Request model for fashion workflow
 class FashionWorkflowRequest(BaseModel):
     """Request model for fashion workflow"""
 
-    base64_image: str
+    # May be left out on follow-ups within a session
+    base64_image: Optional[str] = None
     user_input: str
+    # Conversation to continue, from the session_id of an earlier response
+    session_id: Optional[str] = None
+    # Only send thumbnails inline; full images are fetched from /images/{image_id}
+    thumbnails_only: bool = False
+    # Outfits to generate and quality tier; within a session they default to
+    # the session's earlier choice
+    outfit_count: Optional[int] = Field(None, ge=1, le=MAX_OUTFIT_COUNT)
+    quality: Optional[Literal["fast", "standard", "high"]] = None
+
+
+class RegenerateRequest(BaseModel):
+    """Request model for re-rolling one outfit of a session"""
+
+    # New edit prompt; without it the current prompt gets another take
+    prompt: Optional[str] = None
+    thumbnails_only: bool = False
+
+
+class BatchRequest(BaseModel):
+    """Request model for a batch run over files on the server"""
+
+    # Paths relative to BATCH_DIR: a manifest, or a directory of photos
+    # combined with every one of the prompts
+    manifest: Optional[str] = None
+    images_dir: Optional[str] = None
+    prompts: List[str] = []
+    output_dir: str
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1, le=64)
+    outfit_count: int = Field(DEFAULT_OUTFIT_COUNT, ge=1, le=MAX_OUTFIT_COUNT)
+    quality: Literal["fast", "standard", "high"] = DEFAULT_QUALITY
+    retry_failed: bool = False
+
+
+# Batch runs started by this worker, by output directory
+batch_runs: Dict[str, BatchRunner] = {}
+# Keeps the background batch tasks referenced while they run
+batch_tasks = set()
+
+
+def preload():
+    """Load what the workflow imports lazily, so the first request doesn't wait for it"""
+    try:
+        import requests  # noqa: F401
+        from core import image_codec  # noqa: F401
+
+        near_duplicates.index
+        if outfit_prompt_cache:
+            outfit_prompt_cache.embedder
+    except Exception as e:
+        logger.warning(f"Preloading failed, loading on first use instead: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In the background: the worker starts accepting requests right away
+    preloading = asyncio.create_task(asyncio.to_thread(preload))
+    yield
+    await preloading
+    # Batches stop taking items; they resume when started again
+    for runner in batch_runs.values():
+        runner.stop()
+    # uvicorn has already waited for open HTTP requests (timeout_graceful_shutdown);
+    # what is left are jobs without a connection, i.e. running batch items
+    await inflight_jobs.drain(GRACEFUL_SHUTDOWN_TIMEOUT)
+    near_duplicates.save()
+    await asyncio.to_thread(accounting.usage_ledger.close)
 
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -28,6 +134,96 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+# X-Request-ID of every response, also on its log lines
+app.add_middleware(RequestIdMiddleware)
+
+
+def fashion_response(
+    text: str,
+    images: list,
+    success: bool = True,
+    error_message: str = None,
+    session_id: str = None,
+) -> FastJSONResponse:
+    """
+    Build a FashionResponse-shaped JSON response without re-validating it.
+    The image entries already match ImageResponse, so the multi-megabyte
+    base64 strings are serialized once, without intermediate copies.
+    """
+    return FastJSONResponse(
+        {
+            "text": text,
+            "images": images,
+            "success": success,
+            "error_message": error_message,
+            "session_id": session_id,
+        }
+    )
+
+
+def admit_client(http_request: Request):
+    """
+    Identify the client and take a token from its rate limit.
+    Returns (client id, scheduling weight, rate limit result); raises 429 when exhausted.
+    """
+    client_id, weight = identify_client(
+        http_request.headers,
+        http_request.client.host if http_request.client else None,
+    )
+    limit = rate_limiter.acquire(client_id)
+    if not limit.allowed:
+        retry_after = math.ceil(limit.retry_after)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded, retry in {retry_after} s",
+            headers={"Retry-After": str(retry_after), "X-RateLimit-Remaining": "0"},
+        )
+    return client_id, weight, limit
+
+
+def queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests waiting for this client, retry later",
+        headers={"Retry-After": "5"},
+    )
+
+
+def session_image(session: dict) -> RequestImage:
+    """The photo of a session; raises 410 once it has expired from the image store"""
+    item = image_store.get(session["image_id"])
+    if item is None:
+        raise HTTPException(
+            status_code=410,
+            detail="The session photo has expired, please send base64_image again",
+        )
+    return RequestImage(item[0])
+
+
+def image_entries(generated_images: list, thumbnails_only: bool) -> list:
+    """Convert generated images to ImageResponse-shaped dicts"""
+    images = []
+    for img_data in generated_images:
+        image_id = img_data.get("image_id")
+        image_base64 = img_data.get("image_base64", "")
+        if thumbnails_only and image_id:
+            # Full-size data can only be left out when it is fetchable by id
+            image_base64 = ""
+        elif not image_base64 and image_id:
+            # Outfit carried over from earlier in the session
+            item = image_store.get(image_id)
+            image_base64 = base64.b64encode(item[0]).decode() if item else ""
+        images.append(
+            {
+                "base64": image_base64,
+                "description": img_data.get("description", "Generated outfit image"),
+                "mime_type": img_data.get("mime_type", "image/png"),
+                "image_id": image_id,
+                "thumbnail_base64": img_data.get("thumbnail_base64"),
+                "thumbnail_mime_type": img_data.get("thumbnail_mime_type"),
+            }
+        )
+    return images
 
 
 @app.get("/")
@@ -36,62 +232,173 @@ async def root():
     return {"message": "Vibe Fashion API is running!", "status": "healthy"}
 
 
-@app.post("/fashion-workflow", response_model=FashionResponse)
-async def fashion_workflow_endpoint(request: FashionWorkflowRequest):
+@app.get("/metrics")
+async def metrics():
+    """Cache hit rates, scheduler state and upstream input resolution of this worker"""
+    return {
+        "disk_cache": disk_cache.stats() if disk_cache else None,
+        "semantic_cache": outfit_prompt_cache.stats() if outfit_prompt_cache else None,
+        # Not loaded yet: no photo was checked and the start-up preload hasn't finished
+        "near_duplicates": {
+            "entries": len(near_duplicates.index) if near_duplicates.loaded else None
+        },
+        "coalesced_requests": request_coalescer.coalesced,
+        "scheduler": {"running": job_scheduler.running, "queued": job_scheduler.queued},
+        "intent_batching": {model: b.stats() for model, b in intent_batchers.items()},
+        "adaptive_resolution": {
+            "intent": intent_resolution.stats(),
+            "edit": edit_resolution.stats(),
+        },
+    }
+
+
+def require_admin(http_request: Request):
+    """Raises 403 unless the request carries ADMIN_API_KEY in X-Admin-Key"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (no ADMIN_API_KEY)")
+    if not secrets.compare_digest(http_request.headers.get("x-admin-key", ""), ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+
+@app.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def admin_usage():
+    """Upstream usage and estimated cost per client, across all workers (see core/accounting.py)"""
+    return await asyncio.to_thread(accounting.usage_ledger.report)
+
+
+@app.post(
+    "/fashion-workflow",
+    response_model=FashionResponse,
+    response_class=FastJSONResponse,
+)
+async def fashion_workflow_endpoint(request: FashionWorkflowRequest, http_request: Request):
     """
     Run the complete fashion workflow with image analysis and outfit generation
 
     Args:
         request: FashionWorkflowRequest containing base64 image and user input
+        http_request: Raw request, used to identify the client for rate limiting
 
     Returns:
-        FashionWorkflowResponse with textual suggestions and 4 generated outfit images
+        FashionWorkflowResponse with textual suggestions and outfit_count generated outfit images
     """
     try:
-        # Validate base64 image
-        try:
-            # Try to decode the base64 to validate it
-            base64.b64decode(request.base64_image)
-        except Exception:
+        session = None
+        if request.session_id:
+            session = session_store.get(request.session_id)
+            if session is None:
+                raise HTTPException(status_code=404, detail="Session not found or expired")
+
+        if request.base64_image:
+            # Decode the base64 image once; every stage shares this object
+            try:
+                image = RequestImage.from_base64(request.base64_image)
+                # Reject bytes that aren't an image now rather than mid-workflow
+                image.size
+            except ValueError:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Invalid base64 image format. Please provide a valid base64 encoded image.",
+                )
+        elif session and session["image_id"]:
+            # Text-only follow-up: reuse the photo of the session
+            image = session_image(session)
+        else:
             raise HTTPException(
-                status_code=400,
-                detail="Invalid base64 image format. Please provide a valid base64 encoded image.",
+                status_code=400, detail="base64_image is required without a session"
             )
 
-        # Try to run the main fashion workflow, fallback if it fails
-        try:
-            result = await fashion_workflow.process_request(
-                request.base64_image, request.user_input
-            )
-        except Exception as e:
-            print(f"Main workflow failed, using fallback: {e}")
-            result = await fashion_workflow_fallback.process_request(
-                request.base64_image, request.user_input
+        if inflight_jobs.draining:
+            raise HTTPException(status_code=503, detail="Server is shutting down")
+
+        client_id, weight, limit = admit_client(http_request)
+
+        # Upstream calls, tokens, bytes and cache hits of this request
+        with accounting.track(client_id, "fashion-workflow") as usage:
+            outfit_count = request.outfit_count or (session or {}).get(
+                "outfit_count", DEFAULT_OUTFIT_COUNT
             )
+            quality = request.quality or (session or {}).get("quality", DEFAULT_QUALITY)
+
+            # Near-duplicates only of this client's earlier photos
+            image_key = await asyncio.to_thread(near_duplicates.canonical_digest, image, client_id)
+            # Same photo as the session's current outfits: try to edit just one of them
+            follow_up = bool(session and session["outfits"] and session["image_key"] == image_key)
+
+            async def run_workflow():
+                # This request runs the workflow; coalesced ones await its result
+                usage.coalesced = False
+                # Larger runs take a proportionally larger share of the fair queue
+                cost = outfit_count / DEFAULT_OUTFIT_COUNT
+                async with job_scheduler.slot(client_id, weight, cost), inflight_jobs.track():
+                    with memory_profile("fashion-workflow", enabled=PROFILE_MEMORY):
+                        if follow_up:
+                            result = await fashion_workflow.process_follow_up(
+                                image,
+                                request.user_input,
+                                session["outfits"],
+                                session["history"],
+                                quality,
+                                image_key,
+                            )
+                            if result:
+                                return result
+                        # Try to run the main fashion workflow, fallback if it fails
+                        try:
+                            return await fashion_workflow.process_request(
+                                image, request.user_input, outfit_count, quality, image_key
+                            )
+                        except Exception as e:
+                            logger.warning(f"Main workflow failed, using fallback: {e}")
+                            # Imported on first use: it pulls in PIL and is rarely needed
+                            from core.fashion_workflow_fallback import fashion_workflow_fallback
 
-        # Convert generated images to the expected format
-        images = []
-        for img_data in result.get("generated_images", []):
-            images.append(
-                {
-                    "base64": img_data.get("image_base64", ""),
-                    "description": img_data.get(
-                        "description", "Generated outfit image"
-                    ),
-                }
+                            return await fashion_workflow_fallback.process_request(
+                                image, request.user_input, outfit_count
+                            )
+
+            # Identical requests (same or near-duplicate photo, same text and
+            # options) that arrive while one is running share its result
+            coalesce_key = cache_key(
+                image_key,
+                request.user_input,
+                str(outfit_count),
+                quality,
+                session["id"] if follow_up else "",
             )
+            usage.coalesced = True
+            try:
+                result = await request_coalescer.run(coalesce_key, run_workflow)
+            except QueueFullError:
+                raise queue_full_error()
 
-        return FashionResponse(
-            text=result["suggestions"],
-            images=images,
-            success=result["success"],
-            error_message=result.get("error"),
-        )
+            session = session or session_store.create()
+            session["outfit_count"] = outfit_count
+            session["quality"] = quality
+            if session["image_key"] != image_key:
+                session["image_id"] = image_store.put(image.data, image.mime_type)
+                session["image_key"] = image_key
+            if result["success"] and result.get("generated_images"):
+                session["outfits"] = [session_outfit(img) for img in result["generated_images"]]
+            session_store.add_exchange(session, request.user_input, result["suggestions"])
+            session_store.save(session)
+
+            images = image_entries(result.get("generated_images", []), request.thumbnails_only)
+
+            response = fashion_response(
+                text=result["suggestions"],
+                images=images,
+                success=result["success"],
+                error_message=result.get("error"),
+                session_id=session["id"],
+            )
+            response.headers["X-RateLimit-Remaining"] = str(limit.remaining)
+            return response
 
     except HTTPException:
         raise
     except Exception as e:
-        return FashionResponse(
+        return fashion_response(
             text="I'm sorry, I encountered an error processing your request.",
             images=[],
             success=False,
@@ -99,5 +406,184 @@ async def fashion_workflow_endpoint(request: FashionWorkflowRequest):
         )
 
 
+@app.post(
+    "/sessions/{session_id}/outfits/{index}/regenerate",
+    response_model=FashionResponse,
+    response_class=FastJSONResponse,
+)
+async def regenerate_outfit(
+    session_id: str, index: int, request: RegenerateRequest, http_request: Request
+):
+    """
+    Re-roll one outfit of a session (index into its images) instead of all of
+    them: one image edit, reusing the session's photo and other outfits.
+    """
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    if not 0 <= index < len(session["outfits"]):
+        raise HTTPException(status_code=404, detail=f"Session has no outfit {index}")
+    if request.prompt:
+        reason = validate_outfit_prompt(request.prompt)
+        if reason:
+            raise HTTPException(status_code=422, detail=f"Invalid prompt: {reason}")
+
+    image = session_image(session)
+    if inflight_jobs.draining:
+        raise HTTPException(status_code=503, detail="Server is shutting down")
+    client_id, weight, limit = admit_client(http_request)
+
+    try:
+        # A single image edit, a fraction of a default request
+        cost = 1 / DEFAULT_OUTFIT_COUNT
+        with accounting.track(client_id, "regenerate"):
+            async with job_scheduler.slot(client_id, weight, cost), inflight_jobs.track():
+                result = await fashion_workflow.process_regenerate(
+                    image,
+                    session["outfits"],
+                    index,
+                    request.prompt,
+                    session["image_key"],
+                    session.get("quality", DEFAULT_QUALITY),
+                )
+    except QueueFullError:
+        raise queue_full_error()
+
+    if result["success"]:
+        session["outfits"] = [session_outfit(img) for img in result["generated_images"]]
+        session_store.save(session)
+
+    response = fashion_response(
+        text=result["suggestions"],
+        images=image_entries(result["generated_images"], request.thumbnails_only),
+        success=result["success"],
+        error_message=result.get("error"),
+        session_id=session_id,
+    )
+    response.headers["X-RateLimit-Remaining"] = str(limit.remaining)
+    return response
+
+
+def batch_path(relative: str) -> Path:
+    """A path inside BATCH_DIR; raises 400 for anything outside it"""
+    root = Path(BATCH_DIR).resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=400, detail=f"{relative} is outside the batch directory")
+    return path
+
+
+def batch_slot(batch_id: str, concurrency: int):
+    """Job slot of one batch item: batches share the fair queue with interactive requests"""
+
+    @asynccontextmanager
+    async def slot(cost: float):
+        async with job_scheduler.slot(
+            f"batch:{batch_id}", BATCH_WEIGHT, cost, queue_limit=concurrency
+        ), inflight_jobs.track():
+            yield
+
+    return slot
+
+
+@app.post("/batches", status_code=202, dependencies=[Depends(require_admin)])
+async def start_batch(request: BatchRequest):
+    """
+    Start a batch run in the background (see core/batch.py). Starting it
+    again with the same output_dir resumes it. Poll GET /batches/{output_dir}.
+    """
+    output_dir = batch_path(request.output_dir)
+    batch_id = str(output_dir.relative_to(Path(BATCH_DIR).resolve()))
+    if batch_id in batch_runs and not batch_runs[batch_id].finished:
+        raise HTTPException(status_code=409, detail=f"Batch {batch_id} is already running")
+    if inflight_jobs.draining:
+        raise HTTPException(status_code=503, detail="Server is shutting down")
+
+    if request.manifest:
+        manifest = batch_path(request.manifest)
+        if not manifest.is_file():
+            raise HTTPException(status_code=400, detail=f"Manifest {request.manifest} not found")
+        items = read_manifest(manifest, root=Path(BATCH_DIR).resolve())
+    elif request.images_dir and request.prompts:
+        images_dir = batch_path(request.images_dir)
+        if not images_dir.is_dir():
+            raise HTTPException(status_code=400, detail=f"Directory {request.images_dir} not found")
+        items = directory_items(images_dir, request.prompts, root=Path(BATCH_DIR).resolve())
+    else:
+        raise HTTPException(status_code=400, detail="Send a manifest, or images_dir with prompts")
+
+    runner = BatchRunner(
+        fashion_workflow,
+        items,
+        output_dir,
+        request.concurrency,
+        request.outfit_count,
+        request.quality,
+        request.retry_failed,
+        slot=batch_slot(batch_id, request.concurrency),
+        client_id=f"batch:{batch_id}",
+    )
+    batch_runs[batch_id] = runner
+    task = asyncio.create_task(runner.run())
+    batch_tasks.add(task)
+    task.add_done_callback(batch_tasks.discard)
+    return {"batch_id": batch_id, **runner.stats()}
+
+
+@app.get("/batches/{batch_id:path}", dependencies=[Depends(require_admin)])
+async def get_batch(batch_id: str):
+    """Progress and throughput of a batch run"""
+    runner = batch_runs.get(batch_id)
+    if runner:
+        return {"batch_id": batch_id, **runner.stats()}
+    # Started by another worker or an earlier process: read its stats file
+    stats = load_stats(batch_path(batch_id))
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"batch_id": batch_id, **stats}
+
+
+@app.delete("/batches/{batch_id:path}", dependencies=[Depends(require_admin)])
+async def stop_batch(batch_id: str):
+    """Stop a batch run of this worker after its running items"""
+    runner = batch_runs.get(batch_id)
+    if runner is None:
+        raise HTTPException(status_code=404, detail="Batch not running in this worker")
+    runner.stop()
+    return {"stopping": batch_id}
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Current outfits and chat history of a conversation"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a conversation, e.g. when the user starts over"""
+    session_store.delete(session_id)
+    return {"deleted": session_id}
+
+
+@app.get("/images/{image_id}")
+async def get_image(image_id: str):
+    """Full-resolution generated image, referenced by the image_id of a response"""
+    item = image_store.get(image_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Image not found or expired")
+
+    data, mime_type = item
+    # Ids are content hashes, so the bytes behind an id never change
+    return Response(
+        content=data,
+        media_type=mime_type,
+        headers={"Cache-Control": "public, max-age=86400, immutable"},
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Run the fashion workflow over a manifest or a directory of photos
+
+Examples (from services/backend):
+    python batch.py --manifest briefs.jsonl --output runs/spring
+    python batch.py --images photos/ --prompt "smart-casual office looks" --output runs/office
+    python batch.py --manifest briefs.jsonl --output runs/spring --retry-failed
+
+Re-running with the same output directory resumes an interrupted batch;
+see core/batch.py for the manifest and output formats.
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from core.batch import BatchRunner, directory_items, read_manifest
+from core.logs import configure_logging
+from core.quality import DEFAULT_QUALITY, QUALITY_TIERS
+from settings import BATCH_CONCURRENCY, DEFAULT_OUTFIT_COUNT, MAX_OUTFIT_COUNT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", type=Path, help="JSON lines of {image, prompt}")
+    source.add_argument("--images", type=Path, help="directory of photos")
+    parser.add_argument("--prompt", action="append", default=[], help="style brief for --images (repeatable)")
+    parser.add_argument("--prompts-file", type=Path, help="style briefs for --images, one per line")
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--outfit-count", type=int, default=DEFAULT_OUTFIT_COUNT,
+                        choices=range(1, MAX_OUTFIT_COUNT + 1), metavar="1-8")
+    parser.add_argument("--quality", choices=sorted(QUALITY_TIERS), default=DEFAULT_QUALITY)
+    parser.add_argument("--retry-failed", action="store_true", help="run failed items again")
+    args = parser.parse_args()
+
+    if args.manifest:
+        items = read_manifest(args.manifest)
+    else:
+        prompts = list(args.prompt)
+        if args.prompts_file:
+            prompts += [line.strip() for line in args.prompts_file.read_text().splitlines() if line.strip()]
+        if not prompts:
+            parser.error("--images needs --prompt or --prompts-file")
+        items = directory_items(args.images, prompts)
+
+    configure_logging()
+    # Imported here: loading the workflow pulls in the caches and indexes
+    from core.fashion_workflow import fashion_workflow
+
+    runner = BatchRunner(
+        fashion_workflow,
+        items,
+        args.output,
+        args.concurrency,
+        args.outfit_count,
+        args.quality,
+        args.retry_failed,
+    )
+    try:
+        stats = asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume ({runner.index_path})")
+        return
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
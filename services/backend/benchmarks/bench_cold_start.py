@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long a fresh worker takes to serve its first request.
+
+Cloud Run and Railway scale the backend to zero, so every scale-up pays for
+the interpreter start, the imports of api.py and the app start-up. This
+profiles the imports with `python -X importtime`, checks that the modules
+kept off the start-up path (numpy, requests, PIL, the fallback workflow) are
+not imported by api.py, then times over several rounds:
+
+    import.api         python -c "import api" in a fresh interpreter
+    startup.first_200  launching uvicorn until GET / first answers 200
+
+The run exits non-zero when a lazily loaded module is imported at start-up
+or the median time to the first 200 is over the budget.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --rounds 10 --budget-ms 1500
+    python -m benchmarks.bench_cold_start --report importtime.txt
+
+Budgets are machine-specific; the default leaves headroom on a laptop.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from benchmarks.harness import measure, print_table
+from benchmarks.load_test import free_port
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Median time from launching uvicorn to the first 200, in milliseconds
+DEFAULT_BUDGET_MS = 1500
+# Loaded on first use (or by the start-up preload), never by `import api`
+LAZY_MODULES = ("numpy", "requests", "PIL", "core.fashion_workflow_fallback", "core.phash_index")
+
+
+class ImportTime(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def server_env(tmp: str) -> Dict[str, str]:
+    """Environment of the measured processes: no upstream calls, state in `tmp`"""
+    return {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        "DISK_CACHE_DIR": os.path.join(tmp, "cache"),
+        "USAGE_LOG_DIR": os.path.join(tmp, "logs"),
+        "USAGE_DB_PATH": os.path.join(tmp, "logs", "usage.sqlite"),
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def import_profile(env: Dict[str, str]) -> str:
+    """The `python -X importtime` report of importing api.py"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stderr
+
+
+def parse_profile(report: str) -> List[ImportTime]:
+    """The modules imported by api.py; api itself comes last"""
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # One space, then two more per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entry = ImportTime(name.strip(), depth, int(self_us), int(cumulative_us))
+        # Children are reported before their parent: a new top-level import
+        # (site, encodings, ...) ends the previous subtree
+        entries.append(entry)
+        if depth == 0:
+            if entry.module == "api":
+                return entries
+            entries = []
+    raise RuntimeError("api not found in the import profile")
+
+
+def print_profile(entries: List[ImportTime], top: int):
+    """Slowest top-level imports of api.py and slowest modules by their own time"""
+    print(f"import api: {entries[-1].cumulative_us / 1000:.1f} ms")
+    direct = sorted((e for e in entries if e.depth == 1), key=lambda e: -e.cumulative_us)
+    print(f"\n{'imported by api.py':<44} {'cumulative':>10}")
+    for entry in direct[:top]:
+        print(f"{entry.module:<44} {entry.cumulative_us / 1000:>10.1f}")
+    own = sorted(entries, key=lambda e: -e.self_us)
+    print(f"\n{'module':<44} {'self':>10}")
+    for entry in own[:top]:
+        print(f"{entry.module:<44} {entry.self_us / 1000:>10.1f}")
+    print("(times in ms)\n")
+
+
+def time_to_first_200(env: Dict[str, str]):
+    """Launch the API with uvicorn and poll GET / until it answers 200"""
+    port = free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "api:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    try:
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("API server exited during startup")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("API server did not answer within 60s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="modules listed in the import profile")
+    parser.add_argument("--report", type=Path, help="also write the raw -X importtime report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(tmp)
+        report = import_profile(env)
+        entries = parse_profile(report)
+        print_profile(entries, args.top)
+        if args.report:
+            args.report.write_text(report)
+            print(f"Import profile written to {args.report}\n")
+
+        import_api = [sys.executable, "-c", "import api"]
+        results = {
+            "import.api": measure(
+                lambda: subprocess.run(import_api, cwd=BACKEND_DIR, env=env, check=True),
+                args.rounds,
+            ),
+            "startup.first_200": measure(lambda: time_to_first_200(env), args.rounds),
+        }
+    print_table(results)
+    print("(cpu is the benchmark's own, not the server's)")
+
+    failures = []
+    imported = {e.module for e in entries}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        failures.append(f"imported at start-up, expected lazily: {', '.join(eager)}")
+    median = results["startup.first_200"]["median_ms"]
+    if median > args.budget_ms:
+        failures.append(f"median time to first 200 {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if failures:
+        print("\nCold-start budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nMedian time to first 200 {median:.0f} ms, within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Quality/size benchmark for transcoding generated outfit images.
+
+Gemini returns PNG, so each sample is first re-encoded as PNG to get the
+baseline, then transcoded to WEBP/AVIF at several qualities. Reports the
+response size, the reduction against PNG, the encode time and the PSNR
+against the original pixels.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_image_transcode
+"""
+
+import argparse
+import io
+import math
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageStat, features
+
+from core.image_codec import encode_image
+
+SAMPLES_DIR = Path(__file__).resolve().parent.parent / "core" / "testing_nb" / "saved_images"
+DEFAULT_CASES = ["WEBP:60", "WEBP:75", "WEBP:80", "WEBP:90", "AVIF:50", "AVIF:65"]
+
+
+def psnr(original: Image.Image, encoded: bytes) -> float:
+    """Peak signal-to-noise ratio of the decoded output against the original"""
+    with Image.open(io.BytesIO(encoded)) as decoded:
+        diff = ImageChops.difference(original, decoded.convert("RGB"))
+    mse = sum(ImageStat.Stat(diff).sum2) / (3 * original.width * original.height)
+    return float("inf") if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", type=Path, default=SAMPLES_DIR)
+    parser.add_argument("--case", action="append", help="FORMAT:QUALITY, repeatable")
+    args = parser.parse_args()
+
+    cases = args.case or DEFAULT_CASES
+    if not features.check("avif"):
+        print("AVIF not available in this Pillow build, skipping AVIF cases")
+        cases = [case for case in cases if not case.upper().startswith("AVIF")]
+
+    totals = {}
+    print(f"{'image':<12} {'format':<9} {'KiB':>8} {'vs PNG':>7} {'ms':>7} {'PSNR dB':>8}")
+    for path in sorted(args.samples.glob("*.jpg")):
+        with Image.open(path) as img:
+            original = img.convert("RGB")
+
+        buffered = io.BytesIO()
+        original.save(buffered, format="PNG")
+        png_size = len(buffered.getvalue())
+        print(f"{path.stem:<12} {'PNG':<9} {png_size / 1024:>8.0f} {'1.0x':>7} {'-':>7} {'inf':>8}")
+
+        for case in cases:
+            output_format, quality = case.upper().split(":")
+            start = time.perf_counter()
+            encoded = encode_image(original, output_format, int(quality))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            ratio = png_size / len(encoded)
+            quality_db = psnr(original, encoded)
+            totals.setdefault(case, []).append((ratio, elapsed_ms, quality_db))
+            print(
+                f"{'':<12} {case:<9} {len(encoded) / 1024:>8.0f} {ratio:>6.1f}x "
+                f"{elapsed_ms:>7.0f} {quality_db:>8.1f}"
+            )
+
+    print("\nMean over samples:")
+    for case, rows in totals.items():
+        n = len(rows)
+        print(
+            f"  {case:<9} {sum(r[0] for r in rows) / n:>5.1f}x smaller, "
+            f"{sum(r[1] for r in rows) / n:>5.0f} ms, {sum(r[2] for r in rows) / n:>5.1f} dB"
+        )
+
+
+if __name__ == "__main__":
+    main()
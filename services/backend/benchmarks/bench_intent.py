@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Accuracy and latency of intent classification, image-always vs two-tier.
+
+Runs every request of a labelled evaluation set (JSON lines with user_input
+and label) through classify_intent against the configured Ollama server,
+with the same photo for all of them. "image" attaches the photo to every
+call (the old behaviour); "two-tier" classifies the text alone and attaches
+a downscaled photo only when Gemma is unsure. For two-tier the requests
+settled by the text pass and those escalated to the image pass are also
+reported separately. The requests run one at a time, so the text pass calls
+classify_texts without the micro-batching window of the server.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_intent
+    python -m benchmarks.bench_intent --image path/to/photo.jpg --mode two-tier
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+# Requests run one at a time: a batch window would only add its wait to
+# every text pass (read by settings on import, so set before core imports)
+os.environ.setdefault("INTENT_BATCH_WINDOW_MS", "0")
+
+from core.adaptive import percentile
+from core.fashion_workflow import classify_intent
+from core.image_payload import RequestImage
+from core.quality import QUALITY_TIERS
+from settings import OLLAMA_API_BASE
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_EVAL_SET = BACKEND_DIR / "benchmarks" / "intent_eval.jsonl"
+DEFAULT_IMAGE = BACKEND_DIR / "core" / "testing_nb" / "test_adnane.jpg"
+MODES = ("image", "two-tier")
+
+
+def load_eval_set(path: Path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(rows):
+    """Accuracy and latency (ms) of a list of (correct, latency_s) rows"""
+    if not rows:
+        return None
+    latencies = [latency * 1000 for _, latency in rows]
+    return {
+        "requests": len(rows),
+        "accuracy": sum(correct for correct, _ in rows) / len(rows),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def run(mode: str, examples, image: RequestImage, quality: str):
+    """Classify every example; returns {"all": rows, "text": rows, "image": rows}"""
+    tier = QUALITY_TIERS[quality]
+    rows = {"all": [], "text": [], "image": []}
+    for example in examples:
+        start = time.perf_counter()
+        label, intent_pass = classify_intent(example["user_input"], image, tier, mode)
+        latency = time.perf_counter() - start
+        row = (label == example["label"], latency)
+        rows["all"].append(row)
+        rows[intent_pass].append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--eval-set", type=Path, default=DEFAULT_EVAL_SET)
+    parser.add_argument("--image", type=Path, default=DEFAULT_IMAGE)
+    parser.add_argument("--quality", choices=sorted(QUALITY_TIERS), default="standard")
+    parser.add_argument("--mode", choices=MODES, action="append")
+    args = parser.parse_args()
+
+    examples = load_eval_set(args.eval_set)
+    image = RequestImage(args.image.read_bytes())
+    # Load the model once so the first request doesn't pay for it
+    classify_intent("warm-up", image, QUALITY_TIERS[args.quality], "image")
+
+    print(f"Ollama: {OLLAMA_API_BASE}  tier: {args.quality}  requests: {len(examples)}  photo: {image.size}")
+    print(f"{'mode':<10} {'pass':<6} {'requests':>8} {'accuracy':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for mode in args.mode or MODES:
+        rows = run(mode, examples, image, args.quality)
+        for intent_pass in ("all", "text", "image") if mode == "two-tier" else ("all",):
+            stats = summarize(rows[intent_pass])
+            if stats is None:
+                continue
+            print(
+                f"{mode:<10} {intent_pass:<6} {stats['requests']:>8} {stats['accuracy']:>9.1%} "
+                f"{stats['p50_ms']:>9.0f} {stats['p95_ms']:>9.0f} {stats['mean_ms']:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
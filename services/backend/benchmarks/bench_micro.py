@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the degraded-mode image path and response serialization.
+
+Covers placeholder rendering, PNG encoding, base64 encode/decode and
+FashionResponse validation/serialization at realistic image sizes (four
+~2 MB generated images). Results are compared against the stored baseline
+and the run exits non-zero when a case regressed beyond the tolerance.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_micro                 # compare with the baseline
+    python -m benchmarks.bench_micro --save-baseline # record a new baseline
+
+Baselines are machine-specific; re-record them when the hardware changes.
+"""
+
+import argparse
+import base64
+import io
+import random
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.harness import (
+    find_regressions,
+    load_baseline,
+    measure,
+    print_table,
+    save_baseline,
+)
+from core.fashion_workflow import create_placeholder_images
+from core.fashion_workflow_fallback import create_fashion_placeholder_images
+from models import FashionResponse
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+SAMPLE_IMAGE = (
+    Path(__file__).resolve().parent.parent / "core" / "testing_nb" / "saved_images" / "image_1.jpg"
+)
+PROMPTS = [
+    f"Replace current clothing with outfit {i} — linen shirt, chinos and loafers. "
+    "keep body, face, hair, skin tone, pose, lighting, and background unchanged."
+    for i in range(1, 5)
+]
+# Gemini returns PNGs of roughly this size
+GENERATED_IMAGE_BYTES = 2 * 1024 * 1024
+
+
+def build_cases():
+    """Return {name: callable}; inputs are prepared once, outside the timings"""
+    with Image.open(SAMPLE_IMAGE) as img:
+        photo = img.convert("RGB").resize((1024, 1024))
+
+    rng = random.Random(0)
+    raw_image = rng.randbytes(GENERATED_IMAGE_BYTES)
+    image_b64 = base64.b64encode(raw_image).decode()
+    response_data = {
+        "text": "Four looks that move from polished to playful. " * 8,
+        "images": [
+            {"base64": image_b64, "description": f"Generated outfit {i}", "mime_type": "image/png"}
+            for i in range(4)
+        ],
+        "success": True,
+        "error_message": None,
+    }
+    response = FashionResponse(**response_data)
+
+    def encode_png():
+        buffered = io.BytesIO()
+        photo.save(buffered, format="PNG")
+        return buffered.getvalue()
+
+    # Keep the fallback renderer's random palette choice deterministic
+    def fashion_placeholders():
+        random.seed(0)
+        return create_fashion_placeholder_images(PROMPTS)
+
+    return {
+        "placeholder.fallback_x4": fashion_placeholders,
+        "placeholder.workflow_x4": lambda: create_placeholder_images(PROMPTS),
+        "png.encode_1024": encode_png,
+        "base64.encode_2mb": lambda: base64.b64encode(raw_image),
+        "base64.decode_2mb": lambda: base64.b64decode(image_b64),
+        "response.validate_4x2mb": lambda: FashionResponse(**response_data),
+        "response.json_4x2mb": response.model_dump_json,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 = 50%%")
+    parser.add_argument("--compare", default="min_ms", choices=["min_ms", "median_ms", "mean_ms"])
+    parser.add_argument("-k", dest="select", help="only run cases containing this string")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.select:
+        cases = {name: fn for name, fn in cases.items() if args.select in name}
+
+    results = {name: measure(fn, args.rounds) for name, fn in cases.items()}
+    print_table(results)
+
+    if args.save_baseline:
+        baseline = load_baseline(args.baseline)
+        baseline.update(results)
+        save_baseline(args.baseline, baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("No baseline found, run with --save-baseline first")
+        return
+
+    regressions = find_regressions(results, baseline, args.tolerance, args.compare)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
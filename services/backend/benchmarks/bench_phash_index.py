@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Lookup latency of the perceptual hash index at 1M entries.
+
+Fills a PerceptualHashIndex with random 64-bit hashes and times lookups of
+near-duplicates (existing hashes with up to max_distance bits flipped) and
+of unknown hashes, against a brute-force NumPy scan of the same entries.
+Also reports the build, merge, save and load times.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_phash_index
+    python -m benchmarks.bench_phash_index --entries 100000 --distance 8
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.harness import measure, print_table
+from core.phash_index import PerceptualHashIndex
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:>9.0f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--distance", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(args.entries)]
+    digests = [f"{i:064x}" for i in range(args.entries)]
+    path = Path(tempfile.mkdtemp()) / "phash-index.npz"
+    index = PerceptualHashIndex(args.distance, args.entries, float("inf"), str(path))
+
+    def build():
+        for dhash, digest in zip(hashes, digests):
+            index.add(dhash, digest)
+        index.merge()
+
+    print(f"{args.entries:,} entries, max distance {args.distance}")
+    timed("build (add + merges)", build)
+    timed("merge (full rebuild)", index.merge)
+    timed("save", index.save)
+    timed("load", lambda: PerceptualHashIndex(args.distance, args.entries, float("inf"), str(path)))
+    print()
+
+    near = [flip_bits(rng.choice(hashes), rng.randint(0, args.distance), rng) for _ in range(args.queries)]
+    unknown = [rng.getrandbits(64) for _ in range(args.queries)]
+    assert all(index.nearest(query) for query in near), "a near-duplicate was missed"
+
+    all_hashes = np.array(hashes, np.uint64)
+
+    def brute_force(queries):
+        for query in queries:
+            distances = np.bitwise_count(all_hashes ^ np.uint64(query))
+            int(np.argmin(distances))
+
+    def lookups(queries):
+        for query in queries:
+            index.nearest(query)
+
+    results = {
+        "index.near_duplicate": measure(lambda: lookups(near), args.rounds),
+        "index.unknown": measure(lambda: lookups(unknown), args.rounds),
+        "brute_force.numpy_scan": measure(lambda: brute_force(near), args.rounds),
+    }
+    # Report per lookup rather than per batch of queries
+    for stats in results.values():
+        for key in ("min_ms", "median_ms", "mean_ms", "stddev_ms", "cpu_median_ms"):
+            stats[key] /= args.queries
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark Ollama prompt-eval time per request, before and after prompt-prefix caching.
+
+"inline" rebuilds the whole prompt in the user message on every request (the old
+behaviour), "cached" sends the static part as a stable system message with
+keep_alive so Ollama can reuse the KV cache of the shared prefix.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_prompt_eval --requests 10
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+from core.fashion_workflow import build_ollama_payload
+from core.prompts import (
+    INTENT_SYSTEM_PROMPT,
+    OUTFIT_SYSTEM_PROMPT,
+    render_intent_prompt,
+    render_outfit_prompt,
+)
+from settings import GEMMA_MODEL_NAME, OLLAMA_API_BASE
+
+USER_INPUTS = [
+    "casual outfit for work",
+    "something for a summer wedding",
+    "streetwear looks for a concert",
+    "smart-casual for a first date",
+    "cozy winter weekend outfit",
+]
+
+STAGES = {
+    "intent": (INTENT_SYSTEM_PROMPT, render_intent_prompt),
+    "outfits": (OUTFIT_SYSTEM_PROMPT, render_outfit_prompt),
+}
+
+
+def build_payload(mode: str, system_prompt: str, user_prompt: str, model: str):
+    """Payload for one request in the given mode"""
+    if mode == "inline":
+        payload = build_ollama_payload(
+            user_prompt=f"{system_prompt}\n\n{user_prompt}", model=model
+        )
+        # The old requests didn't pin the model in memory
+        payload.pop("keep_alive", None)
+        payload.pop("options", None)
+        return payload
+    return build_ollama_payload(
+        system_prompt=system_prompt, user_prompt=user_prompt, model=model
+    )
+
+
+def run(mode: str, stage: str, count: int, model: str):
+    """Send `count` requests and return prompt-eval stats in milliseconds"""
+    system_prompt, render = STAGES[stage]
+    eval_ms, eval_tokens, wall_ms = [], [], []
+
+    for i in range(count):
+        user_input = USER_INPUTS[i % len(USER_INPUTS)]
+        payload = build_payload(mode, system_prompt, render(user_input), model)
+        # Only the prompt matters here, keep generation short
+        payload.setdefault("options", {})["num_predict"] = 1
+
+        start = time.perf_counter()
+        response = requests.post(f"{OLLAMA_API_BASE}/api/chat", json=payload, timeout=300)
+        response.raise_for_status()
+        wall_ms.append((time.perf_counter() - start) * 1000)
+
+        data = response.json()
+        eval_ms.append(data.get("prompt_eval_duration", 0) / 1e6)
+        eval_tokens.append(data.get("prompt_eval_count", 0))
+
+    return {
+        # The first request warms the cache, report it separately
+        "first_ms": eval_ms[0],
+        "median_ms": statistics.median(eval_ms[1:] or eval_ms),
+        "median_tokens": statistics.median(eval_tokens[1:] or eval_tokens),
+        "median_wall_ms": statistics.median(wall_ms[1:] or wall_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--model", default=GEMMA_MODEL_NAME)
+    parser.add_argument("--stage", choices=sorted(STAGES), action="append")
+    args = parser.parse_args()
+
+    print(f"Ollama: {OLLAMA_API_BASE}  model: {args.model}  requests: {args.requests}")
+    print(f"{'stage':<8} {'mode':<7} {'first ms':>9} {'median ms':>10} {'tokens':>7} {'wall ms':>9}")
+    for stage in args.stage or sorted(STAGES):
+        for mode in ("inline", "cached"):
+            stats = run(mode, stage, args.requests, args.model)
+            print(
+                f"{stage:<8} {mode:<7} {stats['first_ms']:>9.1f} {stats['median_ms']:>10.1f} "
+                f"{stats['median_tokens']:>7.0f} {stats['median_wall_ms']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Per-response CPU time and peak memory of /fashion-workflow serialization.
+
+Compares FastAPI's default path for a response_model (validate the model,
+jsonable_encoder, json.dumps) with FastJSONResponse rendering the plain
+response dict, at four generated images of 2 MB each.
+
+Usage (from services/backend):
+    python -m benchmarks.bench_serialization
+"""
+
+import argparse
+import base64
+import random
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from benchmarks.harness import measure, measure_peak_memory, print_table
+from models import FashionResponse
+from responses import FastJSONResponse
+
+
+def build_response_data(image_count: int, image_bytes: int) -> dict:
+    rng = random.Random(0)
+    image_b64 = base64.b64encode(rng.randbytes(image_bytes)).decode()
+    return {
+        "text": "Four looks that move from polished to playful. " * 8,
+        "images": [
+            {
+                # Distinct strings, like four different generated images
+                "base64": image_b64[:-8] + f"{i:08d}",
+                "description": f"Generated outfit {i}",
+                "mime_type": "image/png",
+                "image_id": None,
+                "thumbnail_base64": None,
+                "thumbnail_mime_type": None,
+            }
+            for i in range(image_count)
+        ],
+        "success": True,
+        "error_message": None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--image-mb", type=float, default=2.0)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    data = build_response_data(args.images, int(args.image_mb * 1024 * 1024))
+
+    cases = {
+        # What FastAPI does with response_model and a returned model/dict
+        "default: validate+encoder+json": lambda: JSONResponse(
+            jsonable_encoder(FashionResponse(**data))
+        ).body,
+        "pydantic model_dump_json": lambda: Response(
+            FashionResponse(**data).model_dump_json()
+        ).body,
+        "FastJSONResponse (orjson)": lambda: FastJSONResponse(
+            data
+        ).body,
+    }
+
+    results = {}
+    for name, fn in cases.items():
+        results[name] = measure(fn, args.rounds)
+        results[name]["peak_mib"] = measure_peak_memory(fn)
+
+    payload_mib = len(FastJSONResponse(data).body) / (1024 * 1024)
+    print(f"{args.images} images x {args.image_mb} MB, response body {payload_mib:.1f} MiB\n")
+    print_table(results)
+
+
+if __name__ == "__main__":
+    main()
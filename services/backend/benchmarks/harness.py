@@ -0,0 +1,102 @@
+"""
+Minimal benchmark harness in the style of pytest-benchmark.
+
+Cases are timed over several rounds, summarised (min/median/mean/stddev)
+and compared against a stored JSON baseline; a case that is slower than the
+baseline by more than the tolerance counts as a regression.
+"""
+
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+
+def measure(fn: Callable[[], object], rounds: int, warmup: int = 1) -> Dict[str, float]:
+    """Time `fn` over `rounds` calls, returning wall and CPU stats in milliseconds"""
+    for _ in range(warmup):
+        fn()
+
+    wall, cpu = [], []
+    for _ in range(rounds):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        fn()
+        wall.append((time.perf_counter() - start) * 1000)
+        cpu.append((time.process_time() - cpu_start) * 1000)
+
+    return {
+        "rounds": rounds,
+        "min_ms": min(wall),
+        "median_ms": statistics.median(wall),
+        "mean_ms": statistics.fmean(wall),
+        "stddev_ms": statistics.stdev(wall) if rounds > 1 else 0.0,
+        "cpu_median_ms": statistics.median(cpu),
+    }
+
+
+def measure_peak_memory(fn: Callable[[], object]) -> float:
+    """Peak Python memory allocated by one call of `fn`, in MiB"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def print_table(results: Dict[str, Dict[str, float]]):
+    """Print results like pytest-benchmark's summary table"""
+    extra = any("peak_mib" in stats for stats in results.values())
+    header = f"{'case':<34} {'min':>9} {'median':>9} {'mean':>9} {'stddev':>8} {'cpu':>9} {'rounds':>6}"
+    print(header + (f" {'peak MiB':>9}" if extra else ""))
+    print("-" * (len(header) + (10 if extra else 0)))
+    for name, stats in results.items():
+        line = (
+            f"{name:<34} {stats['min_ms']:>9.2f} {stats['median_ms']:>9.2f} "
+            f"{stats['mean_ms']:>9.2f} {stats['stddev_ms']:>8.2f} "
+            f"{stats['cpu_median_ms']:>9.2f} {stats['rounds']:>6}"
+        )
+        if extra:
+            line += f" {stats.get('peak_mib', float('nan')):>9.1f}"
+        print(line)
+    print("(times in ms)")
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    stat: str = "min_ms",
+    min_delta_ms: float = 1.0,
+) -> List[str]:
+    """
+    Describe every case slower than baseline * (1 + tolerance) on `stat`.
+    The minimum is the least noisy statistic on shared machines, and deltas
+    below min_delta_ms are ignored so sub-millisecond cases don't flap.
+    """
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        current, reference = stats[stat], baseline[name][stat]
+        if current > reference * (1 + tolerance) and current - reference >= min_delta_ms:
+            regressions.append(
+                f"{name}: {stat} {current:.2f} ms vs baseline "
+                f"{reference:.2f} ms (+{(current / reference - 1) * 100:.0f}%)"
+            )
+    return regressions
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Offline load test for /fashion-workflow.
+
+Starts the Ollama and Gemini stubs, launches the API against them in a
+subprocess and drives /fashion-workflow at a fixed concurrency. Reports
+throughput, latency percentiles, failures and the server's peak RSS (the
+uvicorn process and its workers together).
+
+Usage (from services/backend):
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+    python -m benchmarks.load_test --gemini-latency lognormal:2000:0.5 --gemini-error-rate 0.05
+"""
+
+import argparse
+import base64
+import concurrent.futures
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from benchmarks.stub_servers import GeminiStubHandler, OllamaStubHandler, start_stub
+from core.adaptive import percentile
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_IMAGE = BACKEND_DIR / "core" / "testing_nb" / "saved_images" / "image_1.jpg"
+USER_INPUTS = [
+    "casual outfit for work",
+    "streetwear looks for a concert",
+    "something elegant for a summer wedding",
+    "smart-casual for a first date",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_kib(pid: int) -> int:
+    """Resident set size of a process in KiB (Linux only, 0 elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid: int) -> list:
+    """pid and all of its descendants (Linux only, just pid elsewhere)"""
+    children = {}
+    for entry in Path("/proc").glob("[0-9]*"):
+        try:
+            with open(entry / "stat") as stat:
+                # The fields after the parenthesized command name: state, ppid, ...
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+class RssSampler(threading.Thread):
+    """Samples the peak RSS, summed over a process and its children, while the test runs"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kib = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            total = sum(read_rss_kib(pid) for pid in process_tree(self.pid))
+            self.peak_kib = max(self.peak_kib, total)
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_api(port: int, env: dict, workers: int) -> subprocess.Popen:
+    """Launch the API with uvicorn and wait until it answers health checks"""
+    command = [
+        sys.executable, "-m", "uvicorn", "api:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--workers", str(workers),
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).ok:
+                return process
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API server did not become healthy within 60s")
+
+
+def send_request(url: str, image_b64: str, index: int, thumbnails_only: bool = False):
+    """Return (latency seconds, ok, response bytes)"""
+    payload = {
+        "base64_image": image_b64,
+        "user_input": USER_INPUTS[index % len(USER_INPUTS)],
+        "thumbnails_only": thumbnails_only,
+    }
+    start = time.perf_counter()
+    try:
+        response = requests.post(url, json=payload, timeout=300)
+        ok = response.status_code == 200 and response.json().get("success", False)
+        size = len(response.content)
+    except requests.exceptions.RequestException:
+        ok, size = False, 0
+    return time.perf_counter() - start, ok, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--image", type=Path, default=DEFAULT_IMAGE)
+    parser.add_argument("--thumbnails-only", action="store_true", help="request like the web clients do")
+    parser.add_argument("--ollama-latency", default="lognormal:150:0.4")
+    parser.add_argument("--gemini-latency", default="lognormal:1500:0.3")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    ollama = start_stub(OllamaStubHandler, 0, args.ollama_latency, args.ollama_error_rate)
+    gemini = start_stub(GeminiStubHandler, 0, args.gemini_latency, args.gemini_error_rate)
+
+    port = free_port()
+    # Server-side files of the run (usage totals and log, shared state)
+    scratch = tempfile.mkdtemp(prefix="load-test-")
+    env = {
+        **os.environ,
+        "OLLAMA_API_BASE": f"http://127.0.0.1:{ollama.server_port}",
+        "GEMINI_API_BASE": f"http://127.0.0.1:{gemini.server_port}",
+        "GOOGLE_API": "stub",
+        "DEBUG": "False",
+    }
+    # Every simulated request comes from one client with the same photo and
+    # a few prompts: disable per-client limits and everything that would
+    # answer them without running the pipeline (disk cache, coalescing,
+    # near-duplicate reuse, semantic cache) unless asked for
+    env.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    env.setdefault("MAX_QUEUED_PER_CLIENT", str(args.requests))
+    env.setdefault("DISK_CACHE_DIR", "")
+    env.setdefault("REQUEST_COALESCING", "False")
+    env.setdefault("NEAR_DUPLICATE_DISTANCE", "-1")
+    env.setdefault("SEMANTIC_CACHE_ENABLED", "False")
+    # Keep the run out of the real usage totals and logs
+    env.setdefault("USAGE_DB_PATH", os.path.join(scratch, "usage.sqlite"))
+    env.setdefault("USAGE_LOG_DIR", os.path.join(scratch, "usage"))
+    if args.workers > 1:
+        # Same default as main.py: share state between workers through SQLite
+        state_path = os.path.join(scratch, "state.db")
+        env.setdefault("STATE_BACKEND", f"sqlite:///{state_path}")
+    server = start_api(port, env, args.workers)
+    sampler = RssSampler(server.pid)
+    sampler.start()
+
+    url = f"http://127.0.0.1:{port}/fashion-workflow"
+    image_b64 = base64.b64encode(args.image.read_bytes()).decode()
+
+    try:
+        for i in range(args.warmup):
+            send_request(url, image_b64, i, args.thumbnails_only)
+
+        print(f"Running {args.requests} requests at concurrency {args.concurrency}...")
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(
+                executor.map(
+                    lambda i: send_request(url, image_b64, i, args.thumbnails_only),
+                    range(args.requests),
+                )
+            )
+        elapsed = time.perf_counter() - start
+    finally:
+        sampler.stop()
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies_ms = [latency * 1000 for latency, ok, _ in results if ok]
+    # Same nearest-rank percentile as the adaptive controller (core.adaptive)
+    pct = lambda q: percentile(latencies_ms, q) if latencies_ms else float("nan")
+    failures = sum(1 for _, ok, _ in results if not ok)
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "failures": failures,
+        "throughput_rps": args.requests / elapsed,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": max(latencies_ms, default=float("nan")),
+        "mean_response_kib": sum(size for _, _, size in results) / len(results) / 1024,
+        # Master and worker processes together
+        "server_peak_rss_mib": sampler.peak_kib / 1024,
+    }
+
+    print(f"  throughput:  {report['throughput_rps']:.2f} req/s")
+    print(f"  latency ms:  p50 {report['p50_ms']:.0f}  p95 {report['p95_ms']:.0f}  "
+          f"p99 {report['p99_ms']:.0f}  max {report['max_ms']:.0f}")
+    print(f"  failures:    {failures}/{args.requests}")
+    print(f"  response:    {report['mean_response_kib']:.0f} KiB mean")
+    print(f"  server RSS:  {report['server_peak_rss_mib']:.0f} MiB peak, all {args.workers} worker(s)")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Local stub servers for the Ollama /api/chat and Gemini generateContent endpoints.
+
+They answer with realistic payloads after a configurable latency and fail a
+configurable share of requests, so the backend can be load-tested offline.
+
+Latency specs (milliseconds):
+    "200"                 fixed
+    "uniform:100:300"     uniform between the two bounds
+    "lognormal:200:0.4"   log-normal with the given median and sigma
+
+Usage (from services/backend):
+    python -m benchmarks.stub_servers --ollama-port 11434 --gemini-port 11435
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OUTFITS = [
+    "Replace current clothing with a {style} look — navy blazer, white tee, slim chinos and suede loafers; add a leather watch. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
+    "Replace current clothing with a relaxed {style} outfit — oversized linen shirt, wide-leg trousers and canvas sneakers; woven tote bag. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
+    "Replace current clothing with a sharp {style} ensemble — charcoal knit polo, pleated wool trousers and black derbies; thin silver chain. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
+    "Replace current clothing with a bold {style} style — cropped denim jacket, striped top, black jeans and white boots; round sunglasses. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
+]
+SUMMARY = (
+    "Four looks that move from polished to playful, each built on clean lines "
+    "and a considered palette. Texture does the talking, from crisp cotton to "
+    "soft knits, while accessories keep every outfit personal."
+)
+GEMINI_PATH = re.compile(r"^/v1beta/models/[^/:]+:generateContent")
+
+
+class Latency:
+    """Samples request latencies in seconds from a spec string"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        parts = spec.split(":")
+        self.kind = parts[0] if len(parts) > 1 else "fixed"
+        self.args = [float(p) for p in (parts[1:] if len(parts) > 1 else parts)]
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            low, high = self.args
+            return random.uniform(low, high) / 1000
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return random.lognormvariate(math.log(median), sigma) / 1000
+        return self.args[0] / 1000
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Shared plumbing: latency, error injection, JSON helpers"""
+
+    latency = Latency("0")
+    error_rate = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def simulate(self) -> bool:
+        """Sleep for one latency sample; return False when this request should fail"""
+        time.sleep(self.latency.sample())
+        if random.random() < self.error_rate:
+            self.send_json(500, {"error": "injected failure"})
+            return False
+        return True
+
+    def do_GET(self):
+        self.send_json(200, {"status": "ok"})
+
+
+class OllamaStubHandler(StubHandler):
+    """Mimics Ollama's /api/chat, including NDJSON streaming"""
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_json(404, {"error": "not found"})
+            return
+
+        payload = self.read_json()
+        if not self.simulate():
+            return
+
+        messages = payload.get("messages", [])
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        user_text = messages[-1].get("content", "") if messages else ""
+
+        if payload.get("format") == "json" and user_text.startswith("Requests: "):
+            # Batch intent classification (core.microbatch): one label per request
+            requests = json.loads(user_text[len("Requests: ") :])
+            content = json.dumps({"labels": ["FASHION_REQUEST"] * len(requests)})
+        elif payload.get("format") == "json":
+            style = "casual" if "casual" in user_text.lower() else "modern"
+            content = json.dumps({"outfits": [o.format(style=style) for o in OUTFITS]})
+        elif any("FASHION_REQUEST" in m.get("content", "") for m in messages):
+            content = "FASHION_REQUEST"
+        else:
+            content = SUMMARY
+
+        stats = {
+            "prompt_eval_count": prompt_chars // 4,
+            "prompt_eval_duration": prompt_chars * 20_000,
+            "eval_count": len(content) // 4,
+        }
+
+        if not payload.get("stream"):
+            self.send_json(
+                200,
+                {
+                    "model": payload.get("model"),
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    **stats,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunks = [content[i : i + 16] for i in range(0, len(content), 16)]
+        try:
+            for chunk in chunks:
+                line = {"message": {"role": "assistant", "content": chunk}, "done": False}
+                self._write_chunk(json.dumps(line) + "\n")
+                # Spread token generation over the stream
+                time.sleep(0.002)
+            self._write_chunk(json.dumps({"message": {"content": ""}, "done": True, **stats}) + "\n")
+            self._write_chunk("")
+        except (BrokenPipeError, ConnectionResetError):
+            # The backend stops reading once it has all the outfits it needs
+            self.close_connection = True
+
+    def _write_chunk(self, text: str):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class GeminiStubHandler(StubHandler):
+    """Mimics Gemini generateContent by echoing the input image back"""
+
+    def do_POST(self):
+        if not GEMINI_PATH.match(self.path):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+
+        payload = self.read_json()
+        if not self.simulate():
+            return
+
+        image_b64 = None
+        for content in payload.get("contents", []):
+            for part in content.get("parts", []):
+                if "inline_data" in part:
+                    image_b64 = part["inline_data"]["data"]
+        if image_b64 is None:
+            self.send_json(400, {"error": {"message": "no image"}})
+            return
+
+        # Validate like the real API would
+        base64.b64decode(image_b64)
+        self.send_json(
+            200,
+            {
+                "candidates": [
+                    {
+                        "content": {
+                            "role": "model",
+                            "parts": [
+                                {"inlineData": {"mimeType": "image/png", "data": image_b64}}
+                            ],
+                        }
+                    }
+                ]
+            },
+        )
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_stub(handler: type, port: int, latency: str, error_rate: float) -> ThreadingHTTPServer:
+    """Start a stub server in a daemon thread; port 0 picks a free port"""
+    handler_class = type(
+        handler.__name__,
+        (handler,),
+        {"latency": Latency(latency), "error_rate": error_rate},
+    )
+    server = StubServer(("127.0.0.1", port), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ollama-port", type=int, default=11434)
+    parser.add_argument("--gemini-port", type=int, default=11435)
+    parser.add_argument("--ollama-latency", default="lognormal:150:0.4")
+    parser.add_argument("--gemini-latency", default="lognormal:1500:0.3")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    ollama = start_stub(OllamaStubHandler, args.ollama_port, args.ollama_latency, args.ollama_error_rate)
+    gemini = start_stub(GeminiStubHandler, args.gemini_port, args.gemini_latency, args.gemini_error_rate)
+    print(f"Ollama stub: http://127.0.0.1:{ollama.server_port}")
+    print(f"Gemini stub: http://127.0.0.1:{gemini.server_port}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Cost accounting of upstream calls, per request, stage and client.
+
+The usage of a request lives in a context variable, so the Ollama and Gemini
+helpers of the workflow record their calls without it being passed down:
+asyncio.to_thread copies the context into the worker thread, and the
+workflow's own thread pool submits with contextvars.copy_context().run.
+Calls made outside a tracked request (warm-ups, benchmarks) are not counted.
+
+When a request finishes, its usage is queued for a background writer thread
+(tracked blocks run on the event loop, so no disk I/O happens there), which
+adds it to the per-client totals in a SQLite file shared by the workers of
+the host and writes it as one JSON line to a rotating log. Costs are estimates: GEMINI_COST_PER_EDIT per
+returned Gemini edit plus OLLAMA_COST_PER_GPU_SECOND for the GPU time
+Ollama reports (total_duration).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from core.logs import queued, request_id
+from settings import (
+    GEMINI_COST_PER_EDIT,
+    OLLAMA_COST_PER_GPU_SECOND,
+    USAGE_DB_PATH,
+    USAGE_LOG_BACKUPS,
+    USAGE_LOG_DIR,
+    USAGE_LOG_MAX_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Counters kept per stage ("intent", "outfit_prompts", "summary", "edit", ...);
+# edits are the Gemini calls that returned an image, the billed ones
+COUNTERS = (
+    "calls",
+    "errors",
+    "prompt_tokens",
+    "completion_tokens",
+    "gpu_s",
+    "bytes_sent",
+    "bytes_received",
+    "edits",
+    "cache_hits",
+)
+
+
+def _number(value: float):
+    """Counters are fractional after a batched call is split; keep the JSON short"""
+    value = round(value, 4)
+    return int(value) if value == int(value) else value
+
+
+def estimated_cost(totals: Dict[str, float]) -> float:
+    return (
+        totals.get("edits", 0) * GEMINI_COST_PER_EDIT
+        + totals.get("gpu_s", 0) * OLLAMA_COST_PER_GPU_SECOND
+    )
+
+
+class RequestUsage:
+    """Upstream usage of one request, filled in from its worker threads"""
+
+    def __init__(self, client_id: str = None, endpoint: str = None):
+        self.client_id = client_id
+        self.endpoint = endpoint
+        # Matches the request's log lines (core.logs)
+        self.request_id = request_id.get()
+        self.stages: Dict[str, Counter] = {}
+        # Served by an identical request running at the same time
+        self.coalesced = False
+        self.started = time.perf_counter()
+        self.wall_s = None
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, **counters: float):
+        with self._lock:
+            self.stages.setdefault(stage, Counter()).update(counters)
+
+    def merge(self, other: "RequestUsage", share: float = 1.0):
+        """Add `share` of another usage, e.g. one request's part of a batched call"""
+        for stage, counters in other.stages.items():
+            self.add(stage, **{name: value * share for name, value in counters.items()})
+
+    def totals(self) -> Counter:
+        with self._lock:
+            totals = Counter()
+            for counters in self.stages.values():
+                totals.update(counters)
+            return totals
+
+    def summary(self) -> Dict[str, Any]:
+        """The request as logged: totals, estimated cost and savings, and each stage"""
+        totals = self.totals()
+        saved_edits = self.stages.get("edit", Counter())["cache_hits"]
+        return {
+            "time": round(time.time(), 3),
+            "client": self.client_id,
+            "endpoint": self.endpoint,
+            "request_id": self.request_id,
+            "wall_s": _number(self.wall_s or 0.0),
+            "coalesced": self.coalesced,
+            **{name: _number(totals[name]) for name in COUNTERS},
+            "estimated_cost_usd": _number(estimated_cost(totals)),
+            "estimated_saved_usd": _number(saved_edits * GEMINI_COST_PER_EDIT),
+            "stages": {
+                stage: {name: _number(value) for name, value in counters.items()}
+                for stage, counters in self.stages.items()
+            },
+        }
+
+
+current_usage: ContextVar[Optional[RequestUsage]] = ContextVar("request_usage", default=None)
+
+
+def record(stage: str, **counters: float):
+    """Count upstream usage against the current request, if there is one"""
+    usage = current_usage.get()
+    if usage is not None:
+        usage.add(stage, **counters)
+
+
+def record_usage(usage: RequestUsage):
+    """Count usage captured elsewhere (see capture) against the current request"""
+    current = current_usage.get()
+    if current is not None:
+        current.merge(usage)
+
+
+def record_cache_hit(stage: str):
+    """An upstream call of `stage` that a cache made unnecessary"""
+    record(stage, cache_hits=1)
+
+
+@contextmanager
+def capture() -> Iterator[RequestUsage]:
+    """Usage of the calls made inside the block, kept apart from the current request's"""
+    usage = RequestUsage()
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
+
+
+@contextmanager
+def track(client_id: str, endpoint: str) -> Iterator[RequestUsage]:
+    """Account the upstream calls made inside the block to one request of `client_id`"""
+    usage = RequestUsage(client_id, endpoint)
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
+        usage_ledger.add(usage)
+
+
+class UsageLedger:
+    """
+    Per-client usage totals, plus the per-request log.
+
+    Totals live in their own SQLite file rather than the state backend, whose
+    memory and size limits evict entries: billing data must not be dropped to
+    make room for cached images. The file is shared by the workers of a host,
+    with one row per client updated in place.
+    """
+
+    # Columns summed per client
+    TOTALS = (
+        "requests",
+        "coalesced",
+        "wall_s",
+        *COUNTERS,
+        "estimated_cost_usd",
+        "estimated_saved_usd",
+    )
+
+    def __init__(self, db_path: str, log_dir: str, max_bytes: int, backups: int):
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._log = None
+        self._log_lock = threading.Lock()
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        # Summaries of finished requests, written by the writer thread
+        self._pending: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection; the table is created on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._ready_lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    columns = ", ".join(f"{name} REAL NOT NULL DEFAULT 0" for name in self.TOTALS)
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS usage (client TEXT PRIMARY KEY, "
+                        f"first_seen REAL NOT NULL, last_seen REAL NOT NULL, {columns})"
+                    )
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def add(self, usage: RequestUsage):
+        """Queue a finished request for the writer thread; never blocks on disk"""
+        usage.wall_s = time.perf_counter() - usage.started
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_pending, name="usage-ledger", daemon=True
+                )
+                self._writer.start()
+        self._pending.put(usage.summary())
+
+    def flush(self):
+        """Wait until every request queued so far is written"""
+        if self._writer is not None:
+            self._pending.join()
+
+    def close(self):
+        """Write out the queued requests and stop the writer thread"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._pending.put(None)
+            writer.join()
+
+    def _write_pending(self):
+        while True:
+            summary = self._pending.get()
+            try:
+                if summary is None:
+                    return
+                self._write(summary)
+            finally:
+                self._pending.task_done()
+
+    def _write(self, summary: Dict[str, Any]):
+        try:
+            self._add_to_client(summary)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update the usage totals of {summary['client']}: {e}")
+        log = self._get_log()
+        if log:
+            log.info(json.dumps(summary, ensure_ascii=False))
+
+    def _add_to_client(self, summary: Dict[str, Any]):
+        values = {**summary, "requests": 1, "coalesced": int(summary["coalesced"])}
+        names = ", ".join(self.TOTALS)
+        placeholders = ", ".join("?" for _ in self.TOTALS)
+        increments = ", ".join(f"{name} = {name} + excluded.{name}" for name in self.TOTALS)
+        self._connect().execute(
+            f"INSERT INTO usage (client, first_seen, last_seen, {names}) "
+            f"VALUES (?, ?, ?, {placeholders}) "
+            f"ON CONFLICT (client) DO UPDATE SET last_seen = excluded.last_seen, {increments}",
+            (
+                summary["client"],
+                summary["time"],
+                summary["time"],
+                *(values[name] for name in self.TOTALS),
+            ),
+        )
+
+    def clients(self) -> Dict[str, Dict[str, Any]]:
+        """Usage totals of every client seen, across all workers"""
+        columns = ", ".join(self.TOTALS)
+        cursor = self._connect().execute(
+            f"SELECT client, first_seen, last_seen, {columns} FROM usage ORDER BY client"
+        )
+        names = [column[0] for column in cursor.description]
+        clients = {}
+        for row in cursor:
+            totals = dict(zip(names, row))
+            client_id = totals.pop("client")
+            clients[client_id] = {name: _number(value) for name, value in totals.items()}
+        return clients
+
+    def report(self) -> Dict[str, Any]:
+        """Totals per client and over all clients"""
+        self.flush()
+        clients = self.clients()
+        totals = Counter()
+        for client in clients.values():
+            totals.update({k: v for k, v in client.items() if k not in ("first_seen", "last_seen")})
+        return {
+            "clients": clients,
+            "totals": {name: _number(value) for name, value in totals.items()},
+        }
+
+    def _get_log(self) -> Optional[logging.Logger]:
+        """The rotating log of this process, opened on first use"""
+        if not self.log_dir:
+            return None
+        with self._log_lock:
+            if self._log is None:
+                Path(self.log_dir).mkdir(parents=True, exist_ok=True)
+                # One file per worker: rotation isn't safe across processes
+                handler = logging.handlers.RotatingFileHandler(
+                    Path(self.log_dir) / f"usage-{os.getpid()}.jsonl",
+                    maxBytes=self.max_bytes,
+                    backupCount=self.backups,
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                log = logging.getLogger(f"{__name__}.log")
+                log.setLevel(logging.INFO)
+                log.propagate = False
+                # Written by a background thread, like the other logs
+                log.addHandler(queued(handler))
+                self._log = log
+            return self._log
+
+
+# Global usage ledger instance
+usage_ledger = UsageLedger(USAGE_DB_PATH, USAGE_LOG_DIR, USAGE_LOG_MAX_BYTES, USAGE_LOG_BACKUPS)
+atexit.register(usage_ledger.close)
@@ -0,0 +1,155 @@
+"""
+Adaptive input resolution of the upstream calls.
+
+Gemini edit latency grows with the size of the photo, and so does the
+multimodal Ollama intent call. Each stage has a controller that keeps the
+latencies of its recent calls and picks the largest side and the JPEG
+quality of the photo it is sent: when the p95 latency exceeds the stage's
+target the resolution is lowered a step, when there is plenty of headroom
+it is raised again, and after a quiet period it returns to the maximum.
+Decisions wait for fresh samples taken at the current setting, so one
+slow burst doesn't drive the resolution straight to the minimum.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Tuple
+
+from settings import (
+    ADAPTIVE_IDLE_RESET,
+    ADAPTIVE_MAX_IMAGE_SIDE,
+    ADAPTIVE_MAX_JPEG_QUALITY,
+    ADAPTIVE_MIN_IMAGE_SIDE,
+    ADAPTIVE_MIN_JPEG_QUALITY,
+    ADAPTIVE_RESOLUTION,
+    EDIT_TARGET_P95,
+    INTENT_TARGET_P95,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of a non-empty sequence"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class ResolutionController:
+    # Samples at the current setting needed before changing it
+    MIN_SAMPLES = 8
+    # Resolution steps: down by DECREASE, up by INCREASE
+    DECREASE = 0.75
+    INCREASE = 1.25
+    QUALITY_STEP = 5
+    # Raise the resolution while p95 stays below this share of the target
+    HEADROOM = 0.6
+
+    def __init__(
+        self,
+        stage: str,
+        target_p95: float,
+        min_side: int,
+        max_side: int,
+        min_quality: int,
+        max_quality: int,
+        idle_reset: float,
+        enabled: bool = True,
+    ):
+        self.stage = stage
+        self.target_p95 = target_p95
+        self.min_side = min_side
+        self.max_side = max_side
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.idle_reset = idle_reset
+        self.enabled = enabled
+        self.side = max_side
+        self.quality = max_quality
+        self.adjustments = 0
+        # Latencies since the last change of setting
+        self._samples = deque(maxlen=200)
+        # Recent latencies whatever the setting, for metrics
+        self._recent = deque(maxlen=200)
+        self._last_sample = time.monotonic()
+        self._lock = threading.Lock()
+
+    def settings(self, max_side: int = 0) -> Tuple[int, int]:
+        """
+        (largest side, JPEG quality) to send the photo with; max_side is the
+        cap of the request's quality tier (0 = none)
+        """
+        if not self.enabled:
+            return max_side, self.max_quality
+        with self._lock:
+            if time.monotonic() - self._last_sample > self.idle_reset and self.side < self.max_side:
+                # Quiet for a while: go back to full resolution
+                self._set(self.max_side, self.max_quality, "idle")
+            side, quality = self.side, self.quality
+        return (min(side, max_side) if max_side else side), quality
+
+    def record(self, latency: float):
+        """Latency in seconds of one upstream call made with the current setting"""
+        with self._lock:
+            self._last_sample = time.monotonic()
+            self._samples.append(latency)
+            self._recent.append(latency)
+            if not self.enabled or len(self._samples) < self.MIN_SAMPLES:
+                return
+
+            p95 = percentile(self._samples, 95)
+            if p95 > self.target_p95 and (self.side > self.min_side or self.quality > self.min_quality):
+                self._set(
+                    max(self.min_side, int(self.side * self.DECREASE)),
+                    max(self.min_quality, self.quality - self.QUALITY_STEP),
+                    f"p95 {p95:.1f}s over target",
+                )
+            elif p95 < self.target_p95 * self.HEADROOM and (
+                self.side < self.max_side or self.quality < self.max_quality
+            ):
+                self._set(
+                    min(self.max_side, int(self.side * self.INCREASE)),
+                    min(self.max_quality, self.quality + self.QUALITY_STEP),
+                    f"p95 {p95:.1f}s well under target",
+                )
+
+    def _set(self, side: int, quality: int, reason: str):
+        logger.info(f"{self.stage}: input resolution {self.side} -> {side} px, quality {quality} ({reason})")
+        self.side = side
+        self.quality = quality
+        self.adjustments += 1
+        self._samples.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        recent = list(self._recent)
+        return {
+            "enabled": self.enabled,
+            "max_side": self.side,
+            "jpeg_quality": self.quality,
+            "target_p95_s": self.target_p95,
+            "p50_s": percentile(recent, 50) if recent else None,
+            "p95_s": percentile(recent, 95) if recent else None,
+            "samples": len(recent),
+            "adjustments": self.adjustments,
+        }
+
+
+def create_controller(stage: str, target_p95: float) -> ResolutionController:
+    return ResolutionController(
+        stage,
+        target_p95,
+        ADAPTIVE_MIN_IMAGE_SIDE,
+        ADAPTIVE_MAX_IMAGE_SIDE,
+        ADAPTIVE_MIN_JPEG_QUALITY,
+        ADAPTIVE_MAX_JPEG_QUALITY,
+        ADAPTIVE_IDLE_RESET,
+        ADAPTIVE_RESOLUTION,
+    )
+
+
+# Global per-stage controllers (per worker process)
+intent_resolution = create_controller("intent", INTENT_TARGET_P95)
+edit_resolution = create_controller("edit", EDIT_TARGET_P95)
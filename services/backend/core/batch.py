@@ -0,0 +1,336 @@
+"""
+Batch outfit generation for catalog-scale runs.
+
+A manifest is a JSON-lines file with one item per line:
+
+    {"image": "photos/model_01.jpg", "prompt": "smart-casual office looks"}
+
+with optional "id", "outfit_count" and "quality" keys (image paths are
+relative to the manifest). Items are streamed through FashionWorkflow with
+bounded parallelism. Every finished item is appended to `results.jsonl` in
+the output directory, with its images saved under `images/`. That index
+doubles as the checkpoint: running the same batch again skips the items it
+already lists, so an interrupted run resumes where it stopped. Throughput
+and latency stats are kept in `stats.json`.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from core import accounting
+from core.adaptive import percentile
+from core.disk_cache import cache_key
+from core.image_payload import RequestImage
+from core.logs import request_id
+from core.quality import DEFAULT_QUALITY, QUALITY_TIERS
+from settings import DEFAULT_OUTFIT_COUNT, MAX_OUTFIT_COUNT
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = (*accounting.COUNTERS, "estimated_cost_usd", "estimated_saved_usd")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+EXTENSIONS = {
+    "image/webp": "webp",
+    "image/avif": "avif",
+    "image/jpeg": "jpg",
+    "image/png": "png",
+}
+
+
+class ManifestError(ValueError):
+    """A manifest line that can't be turned into a batch item"""
+
+
+def outside(image: Path, root: Optional[Path]) -> bool:
+    """Whether a resolved image path escapes `root` (no root: anything goes)"""
+    return root is not None and not image.is_relative_to(root)
+
+
+def read_manifest(path: Path, root: Path = None) -> Iterator[Dict[str, Any]]:
+    """
+    Items of a JSON-lines manifest, read lazily; image paths are made
+    absolute. With `root`, images resolving outside it are failed items
+    """
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                image = entry["image"]
+                prompt = entry.get("prompt") or entry["user_input"]
+            except (ValueError, KeyError, TypeError) as e:
+                yield {"id": f"line-{line_number}", "error": f"Invalid manifest line {line_number}: {e!r}"}
+                continue
+            resolved = (path.parent / image).resolve()
+            if outside(resolved, root):
+                error = f"Image of line {line_number} is outside the batch directory"
+                yield {"id": f"line-{line_number}", "error": error}
+                continue
+            yield {**entry, "image": str(resolved), "prompt": prompt}
+
+
+def directory_items(
+    images_dir: Path, prompts: List[str], root: Path = None
+) -> Iterator[Dict[str, Any]]:
+    """Every image of a directory combined with every prompt; with `root`, as read_manifest"""
+    for image in sorted(images_dir.iterdir()):
+        if image.suffix.lower() in IMAGE_SUFFIXES:
+            # Symlinks may point anywhere
+            if outside(image.resolve(), root):
+                logger.warning(f"Skipping {image.name}: outside the batch directory")
+                continue
+            for prompt in prompts:
+                yield {"image": str(image.resolve()), "prompt": prompt}
+
+
+def item_id(item: Dict[str, Any], outfit_count: int, quality: str) -> str:
+    """Stable id of an item, so a resumed run recognises it"""
+    if item.get("id"):
+        return str(item["id"])
+    return cache_key(item["image"], item["prompt"], str(outfit_count), quality)[:16]
+
+
+class BatchRunner:
+    # Write stats.json after this many finished items
+    STATS_EVERY = 10
+
+    def __init__(
+        self,
+        workflow,
+        items: Iterable[Dict[str, Any]],
+        output_dir: Path,
+        concurrency: int,
+        outfit_count: int = DEFAULT_OUTFIT_COUNT,
+        quality: str = DEFAULT_QUALITY,
+        retry_failed: bool = False,
+        slot: Callable[[float], Any] = None,
+        client_id: str = None,
+    ):
+        """
+        `slot(cost)`, if given, returns an async context manager held while an
+        item runs, e.g. a job scheduler slot shared with interactive requests.
+        Upstream usage is accounted to `client_id`, "batch:<output dir name>"
+        by default.
+        """
+        self.workflow = workflow
+        self.items = items
+        self.output_dir = Path(output_dir)
+        self.images_dir = self.output_dir / "images"
+        self.index_path = self.output_dir / "results.jsonl"
+        self.stats_path = self.output_dir / "stats.json"
+        self.concurrency = concurrency
+        self.outfit_count = outfit_count
+        self.quality = quality
+        self.retry_failed = retry_failed
+        self.slot = slot
+        self.client_id = client_id or f"batch:{self.output_dir.name}"
+
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.running = 0
+        self.images = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+        self._latencies: List[float] = []
+        self._stopping = False
+
+    def stop(self):
+        """Start no new items; running ones finish and are recorded"""
+        self._stopping = True
+
+    def _completed_ids(self) -> set:
+        """Ids already in the index: all of them, or only successes with retry_failed"""
+        done = set()
+        if self.index_path.exists():
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        # Torn last line of an interrupted run
+                        continue
+                    if result.get("success") or not self.retry_failed:
+                        done.add(result["id"])
+        return done
+
+    async def run(self) -> Dict[str, Any]:
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        completed = self._completed_ids()
+        self.started = time.time()
+
+        self._write_stats()
+        logger.info(f"Batch {self.output_dir}: {len(completed)} item(s) already done")
+        try:
+            await self._run_items(completed)
+        except Exception as e:
+            # E.g. an unreadable manifest: the finished items stay recorded
+            logger.error(f"Batch {self.output_dir} aborted: {e}")
+            self.error = str(e)
+        finally:
+            self.finished = time.time()
+            self._write_stats()
+        logger.info(f"Batch {self.output_dir} finished: {self.stats()}")
+        return self.stats()
+
+    async def _run_items(self, completed: set):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        with open(self.index_path, "a") as index:
+            try:
+                for item in self.items:
+                    if self._stopping:
+                        break
+                    outfit_count = self.outfit_count
+                    quality = item.get("quality") or self.quality
+                    try:
+                        outfit_count = int(item.get("outfit_count") or outfit_count)
+                    except (TypeError, ValueError):
+                        item = {**item, "error": f"Invalid outfit_count {item['outfit_count']!r}"}
+                    # Unparseable manifest lines have no image, only a line id
+                    item_key = item_id(item, outfit_count, quality) if "image" in item else item["id"]
+                    if item_key in completed:
+                        self.skipped += 1
+                        continue
+                    completed.add(item_key)
+
+                    # Bounded parallelism: wait for a free slot before reading further
+                    await slots.acquire()
+                    task = asyncio.create_task(
+                        self._run_item(item, item_key, outfit_count, quality, index)
+                    )
+                    tasks.add(task)
+                    task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+            finally:
+                # Running items are still recorded when reading the items fails
+                if tasks:
+                    await asyncio.gather(*tasks)
+
+    async def _run_item(self, item, item_key, outfit_count, quality, index):
+        start = time.perf_counter()
+        self.running += 1
+        # The item's log lines carry its id (every item runs in a task of its own)
+        request_id.set(f"{self.client_id}:{item_key}")
+        usage = None
+        try:
+            if "error" in item:
+                raise ManifestError(item["error"])
+            if not 1 <= outfit_count <= MAX_OUTFIT_COUNT or quality not in QUALITY_TIERS:
+                raise ManifestError(f"Invalid outfit_count {outfit_count} or quality {quality!r}")
+
+            image = RequestImage(await asyncio.to_thread(Path(item["image"]).read_bytes))
+            try:
+                image.size
+            except ValueError as e:
+                raise ManifestError(f"{item['image']}: {e}")
+            cost = outfit_count / DEFAULT_OUTFIT_COUNT
+            with accounting.track(self.client_id, "batch") as usage:
+                async with self.slot(cost) if self.slot else nullcontext():
+                    result = await self.workflow.process_request(
+                        image, item["prompt"], outfit_count, quality
+                    )
+            outputs = await asyncio.to_thread(self._save_images, item_key, result)
+            success = result["success"] and bool(outputs)
+            error = result.get("error") or (
+                None if outputs else f"No images generated (intent {result.get('intent_classification')})"
+            )
+            record = {
+                "success": success,
+                "intent": result.get("intent_classification"),
+                "suggestions": result.get("suggestions"),
+                "outputs": outputs,
+                "error": None if success else error,
+            }
+        except Exception as e:
+            logger.warning(f"Batch item {item_key} failed: {e}")
+            record = {"success": False, "outputs": [], "error": str(e)}
+        finally:
+            self.running -= 1
+
+        seconds = time.perf_counter() - start
+        # Upstream calls, tokens and estimated cost of the item
+        costs = usage.summary() if usage else None
+        record = {
+            "id": item_key,
+            "image": item.get("image"),
+            "prompt": item.get("prompt"),
+            "outfit_count": outfit_count,
+            "quality": quality,
+            **record,
+            "seconds": round(seconds, 3),
+            "usage": {name: costs[name] for name in USAGE_FIELDS} if costs else None,
+            "finished_at": time.time(),
+        }
+        # One line per item, flushed to disk before the item counts as done
+        index.write(json.dumps(record, ensure_ascii=False) + "\n")
+        index.flush()
+        os.fsync(index.fileno())
+
+        self._latencies.append(seconds)
+        if record["success"]:
+            self.succeeded += 1
+            self.images += len(record["outputs"])
+        else:
+            self.failed += 1
+        if (self.succeeded + self.failed) % self.STATS_EVERY == 0:
+            self._write_stats()
+
+    def _save_images(self, item_key: str, result: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Write the generated images of an item; placeholders are not kept"""
+        outputs = []
+        for i, generated in enumerate(result.get("generated_images", []), 1):
+            if not generated.get("image_id"):
+                continue
+            extension = EXTENSIONS.get(generated.get("mime_type"), "bin")
+            path = self.images_dir / f"{item_key}-{i}.{extension}"
+            path.write_bytes(base64.b64decode(generated["image_base64"]))
+            outputs.append(
+                {
+                    "path": str(path.relative_to(self.output_dir)),
+                    "prompt": generated.get("prompt"),
+                    "mime_type": generated.get("mime_type"),
+                }
+            )
+        return outputs
+
+    def stats(self) -> Dict[str, Any]:
+        processed = self.succeeded + self.failed
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        minutes = elapsed / 60
+        return {
+            "output_dir": str(self.output_dir),
+            "state": "finished" if self.finished else ("running" if self.started else "pending"),
+            "error": self.error,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "running": self.running,
+            "images": self.images,
+            "elapsed_s": round(elapsed, 1),
+            "items_per_minute": round(processed / minutes, 2) if minutes else None,
+            "images_per_minute": round(self.images / minutes, 2) if minutes else None,
+            "item_p50_s": round(percentile(self._latencies, 50), 2) if self._latencies else None,
+            "item_p95_s": round(percentile(self._latencies, 95), 2) if self._latencies else None,
+        }
+
+    def _write_stats(self):
+        tmp = self.stats_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.stats(), indent=2))
+        os.replace(tmp, self.stats_path)
+
+
+def load_stats(output_dir: Path) -> Optional[Dict[str, Any]]:
+    """stats.json of a batch, as last written by whichever process runs it"""
+    try:
+        return json.loads((Path(output_dir) / "stats.json").read_text())
+    except (OSError, ValueError):
+        return None
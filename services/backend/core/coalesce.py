@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from settings import REQUEST_COALESCING
+
+
+class RequestCoalescer:
+    """
+    Runs identical concurrent requests once.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result instead of starting their own.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A caller that disconnects must not cancel the work for the others
+        return await asyncio.shield(task)
+
+
+# Global request coalescer instance
+request_coalescer = RequestCoalescer(REQUEST_COALESCING)
@@ -0,0 +1,130 @@
+"""
+Near-duplicate detection for incoming photos.
+
+The camera view submits a new frame every second, and consecutive frames of
+someone standing still are practically identical. Frames whose difference
+hashes are within `max_distance` bits map to the digest of the first such
+frame seen, which then stands in for the photo in cache keys and request
+coalescing. The 64-bit hash can't tell the same person in another outfit
+apart, so a match also needs the finer 256-bit hash within
+`max_fine_distance` bits, and photos only match earlier photos of the same
+scope (the client): one user's photo never stands in for another's. Past photos are kept in a perceptual hash index that persists
+next to the disk cache, so near-identical photos keep matching the cached
+edits across restarts. The index (and numpy with it) is loaded on first
+use rather than at import, so it doesn't delay the worker's start-up.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+from core.image_payload import RequestImage
+from settings import (
+    DISK_CACHE_DIR,
+    DISK_CACHE_MAX_AGE,
+    NEAR_DUPLICATE_DISTANCE,
+    NEAR_DUPLICATE_FINE_DISTANCE,
+    NEAR_DUPLICATE_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class NearDuplicateIndex:
+    # Save the index after this many new photos
+    SAVE_EVERY = 1000
+
+    def __init__(
+        self,
+        max_distance: int,
+        max_fine_distance: int,
+        max_entries: int,
+        max_age: float,
+        path: str = None,
+    ):
+        self.max_distance = max_distance
+        self.max_fine_distance = max_fine_distance
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._unsaved = 0
+
+    @property
+    def index(self):
+        """The PerceptualHashIndex, read from `path` on first use"""
+        with self._load_lock:
+            if self._index is None:
+                from core.phash_index import PerceptualHashIndex
+
+                self._index = PerceptualHashIndex(
+                    self.max_distance,
+                    self.max_entries,
+                    self.max_age,
+                    self.path,
+                    self.max_fine_distance,
+                )
+        return self._index
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    @staticmethod
+    def scope_mask(scope: Optional[str]) -> int:
+        """
+        Hashes are stored XORed with a per-scope mask: distances within a
+        scope are unchanged, while hashes of different scopes end up ~32 bits apart
+        """
+        if not scope:
+            return 0
+        return int.from_bytes(hashlib.sha256(scope.encode()).digest()[:8], "big")
+
+    def canonical_digest(self, image: RequestImage, scope: str = None) -> str:
+        """Digest of the closest known near-duplicate within `scope`, or of the image itself"""
+        dhash = image.dhash
+        if dhash is None or self.max_distance < 0:
+            return image.digest
+
+        dhash ^= self.scope_mask(scope)
+        fine = image.fine_dhash
+        with self._lock:
+            match = self.index.nearest(dhash, fine)
+            if match:
+                return match[0]
+
+            self.index.add(dhash, image.digest, fine)
+            self._unsaved += 1
+            if self._unsaved >= self.SAVE_EVERY:
+                self._save_locked()
+            return image.digest
+
+    def _save_locked(self):
+        try:
+            self.index.save()
+            self._unsaved = 0
+        except OSError as e:
+            logger.warning(f"Could not save the perceptual hash index: {e}")
+
+    def save(self):
+        with self._lock:
+            if self._unsaved:
+                self._save_locked()
+
+
+def _index_path() -> Optional[str]:
+    return os.path.join(DISK_CACHE_DIR, "phash-index.npz") if DISK_CACHE_DIR else None
+
+
+# Global near-duplicate index instance
+near_duplicates = NearDuplicateIndex(
+    NEAR_DUPLICATE_DISTANCE,
+    NEAR_DUPLICATE_FINE_DISTANCE,
+    NEAR_DUPLICATE_MAX_ENTRIES,
+    DISK_CACHE_MAX_AGE,
+    _index_path(),
+)
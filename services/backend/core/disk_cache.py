@@ -0,0 +1,198 @@
+"""
+Persistent on-disk cache for generated images and LLM outputs.
+
+Values are stored as content-addressed files (objects/ab/abcdef...) and
+looked up through a SQLite index, so the cache survives redeploys and is
+shared by every worker process on the host:
+
+- writes go to a temporary file that is fsynced and renamed into place
+  before the index row is committed, so a crash never leaves a row that
+  points at a partial file;
+- entries older than max_age are dropped and the least recently used ones
+  are evicted once the total size exceeds max_bytes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from settings import DISK_CACHE_DIR, DISK_CACHE_MAX_AGE, DISK_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    # Run eviction every this many writes
+    EVICT_EVERY = 50
+
+    def __init__(self, root: str, max_bytes: int, max_age: float):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, "
+            "metadata TEXT, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "index.sqlite", timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def _write_object(self, digest: str, data: bytes):
+        path = self._object_path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _read_object(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Return (data, metadata) or None on a miss"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT digest, metadata, created FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > self.max_age:
+            self.misses += 1
+            return None
+
+        digest, metadata, _ = row
+        data = self._read_object(digest)
+        if data is None:
+            # Object removed behind our back: drop the dangling row
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return data, json.loads(metadata or "{}")
+
+    def put(self, key: str, data: bytes, metadata: Dict[str, Any] = None):
+        """Store data under key; identical data is stored once"""
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            self._write_object(digest, data)
+            now = time.time()
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (key, digest, size, metadata, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, digest, len(data), json.dumps(metadata or {}), now, now),
+            )
+        except OSError as e:
+            logger.warning(f"Disk cache write failed: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def get_json(self, key: str) -> Any:
+        """Return a cached JSON value or None on a miss"""
+        found = self.get(key)
+        return json.loads(found[0]) if found else None
+
+    def put_json(self, key: str, value: Any):
+        self.put(key, json.dumps(value).encode())
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                doomed = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            referenced = {row[0] for row in conn.execute("SELECT DISTINCT digest FROM entries")}
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Remove objects no entry points to any more (including leftovers of
+        # crashed writes); recent files may belong to another worker's put()
+        # whose index row isn't committed yet
+        grace = time.time() - 60
+        for path in self.objects.glob("*/*"):
+            if path.name in referenced:
+                continue
+            try:
+                if path.stat().st_mtime < grace:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+def _create_disk_cache() -> Optional[DiskCache]:
+    if not DISK_CACHE_DIR:
+        return None
+    try:
+        return DiskCache(DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES, DISK_CACHE_MAX_AGE)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Disk cache disabled, could not open {DISK_CACHE_DIR}: {e}")
+        return None
+
+
+def cache_key(*parts: str) -> str:
+    """Stable key from arbitrary strings (prompts can be long)"""
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+# Global disk cache instance (None when DISK_CACHE_DIR is empty)
+disk_cache = _create_disk_cache()
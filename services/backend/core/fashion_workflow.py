@@ -12,31 +12,89 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import os
 import base64
 import binascii
 import json
-import requests
 import logging
+import threading
+import time
 import concurrent.futures
+import contextvars
 from pathlib import Path
-from typing import Dict, Any
-from PIL import Image, ImageDraw, ImageFont
-import io
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
 
 from dotenv import load_dotenv
 
-# Setup simple logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+from core import accounting
+from core.adaptive import ResolutionController, edit_resolution, intent_resolution
+from core.dedup import near_duplicates
+from core.disk_cache import cache_key, disk_cache
+from core.image_payload import RequestImage
+from core.image_store import image_store
+from core.logs import SAMPLED
+from core.microbatch import MicroBatcher
+from core.quality import DEFAULT_QUALITY, QualityTier, get_tier
+from core.semantic_cache import outfit_prompt_cache
+from core.outfit_parser import (
+    IncrementalOutfitParser,
+    parse_outfits,
+    validate_outfit_prompt,
 )
+from core.prompts import (
+    BATCH_INTENT_SYSTEM_PROMPT,
+    FOLLOW_UP_SYSTEM_PROMPT,
+    INTENT_SYSTEM_PROMPT,
+    OUT_OF_TOPIC_SYSTEM_PROMPT,
+    OUTFIT_SYSTEM_PROMPT,
+    SUMMARY_SYSTEM_PROMPT,
+    TEXT_INTENT_SYSTEM_PROMPT,
+    default_outfit_prompts,
+    render_batch_intent_prompt,
+    render_follow_up_prompt,
+    render_intent_prompt,
+    render_out_of_topic_prompt,
+    render_outfit_prompt,
+    render_summary_prompt,
+)
+from settings import (
+    DEFAULT_OUTFIT_COUNT,
+    GEMINI_MAX_CONCURRENCY,
+    INTENT_BATCH_MAX_SIZE,
+    INTENT_BATCH_WINDOW_MS,
+    INTENT_IMAGE_MAX_SIDE,
+    INTENT_MODE,
+)
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Bounds the parallel Gemini edits of all requests, whatever their outfit count
+gemini_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
 
-def call_ollama(
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def record_ollama_call(
+    stage: str, data: Dict[str, Any], bytes_sent: int, bytes_received: int, failed: bool = False
+):
+    """Account one Ollama call; `data` is its final response object, with the eval counts"""
+    accounting.record(
+        stage,
+        calls=1,
+        errors=int(failed),
+        prompt_tokens=data.get("prompt_eval_count", 0),
+        completion_tokens=data.get("eval_count", 0),
+        gpu_s=data.get("total_duration", 0) / 1e9,
+        bytes_sent=bytes_sent,
+        bytes_received=bytes_received,
+    )
+
+
+def build_ollama_payload(
     user_prompt: str = None,
     system_prompt: str = None,
     history: list = None,
@@ -44,48 +102,167 @@ def call_ollama(
     base64_image: str = None,
     stream: bool = False,
     json_mode: bool = False,
-) -> str:
+) -> Dict[str, Any]:
+    """Build the /api/chat payload, or None when there is nothing to send"""
+    messages = []
+
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+
+    if history:
+        messages.extend(history)
+
+    if user_prompt:
+        user_message = {"role": "user", "content": user_prompt}
+        if base64_image:
+            user_message["images"] = [base64_image]
+        messages.append(user_message)
+
+    if not messages:
+        return None
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+    }
+
+    if json_mode:
+        payload["format"] = "json"
+
+    # Keep the model resident between requests so the KV cache of the shared
+    # system prompt prefix is reused instead of re-processed
+    from settings import OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX
+    payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+    if OLLAMA_NUM_CTX:
+        # A fixed context size avoids model reloads that would drop the cache
+        payload["options"] = {"num_ctx": OLLAMA_NUM_CTX}
+
+    return payload
+
+
+def stream_ollama(
+    user_prompt: str = None,
+    system_prompt: str = None,
+    history: list = None,
+    model: str = "gemma3:12b",
+    base64_image: str = None,
+    json_mode: bool = False,
+    stage: str = "other",
+) -> Iterator[str]:
     """
-    Calls an Ollama model (multimodal & JSON-safe).
-    Supports system + user prompts, chat history, and optional image input.
+    Streams an Ollama chat completion, yielding content chunks as they arrive.
+    Ollama answers with NDJSON: one JSON object per line, the last one has done=true.
+    Failures are logged and simply end the stream. The call is accounted to
+    `stage` of the current request, also when the consumer stops early.
     """
 
+    body = None
+    received = 0
+    final = {}
+    failed = False
     try:
-        # Use the correct Ollama API base from settings
+        import requests
         from settings import OLLAMA_API_BASE
         url = f"{OLLAMA_API_BASE}/api/chat"
 
-        messages = []
+        payload = build_ollama_payload(
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            history=history,
+            model=model,
+            base64_image=base64_image,
+            stream=True,
+            json_mode=json_mode,
+        )
+        if payload is None:
+            return
+
+        body = json.dumps(payload).encode()
+        with requests.post(url, data=body, headers=JSON_HEADERS, timeout=90, stream=True) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                received += len(line)
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise RuntimeError(data["error"])
+                content = data.get("message", {}).get("content")
+                if content:
+                    yield content
+                if data.get("done"):
+                    final = data
+                    break
 
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
+    except Exception as e:
+        failed = True
+        logger.error(f"Ollama stream failed: {e}")
+    finally:
+        if body is not None:
+            record_ollama_call(stage, final, len(body), received, failed)
 
-        if history:
-            messages.extend(history)
 
-        if user_prompt:
-            user_message = {"role": "user", "content": user_prompt}
-            if base64_image:
-                user_message["images"] = [base64_image]
-            messages.append(user_message)
+def call_ollama(
+    user_prompt: str = None,
+    system_prompt: str = None,
+    history: list = None,
+    model: str = "gemma3:12b",
+    base64_image: str = None,
+    stream: bool = False,
+    json_mode: bool = False,
+    stage: str = "other",
+) -> str:
+    """
+    Calls an Ollama model (multimodal & JSON-safe).
+    Supports system + user prompts, chat history, and optional image input.
+    With stream=True the NDJSON chunks are consumed as they arrive and joined.
+    The call is accounted to `stage` of the current request (core.accounting).
+    """
 
-        if not messages:
-            return "Error: No messages provided"
+    if stream:
+        content = "".join(
+            stream_ollama(
+                user_prompt=user_prompt,
+                system_prompt=system_prompt,
+                history=history,
+                model=model,
+                base64_image=base64_image,
+                json_mode=json_mode,
+                stage=stage,
+            )
+        )
+        return content or "Error: Empty streamed response"
 
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": stream,
-        }
+    try:
+        # Use the correct Ollama API base from settings
+        import requests
+        from settings import OLLAMA_API_BASE
+        url = f"{OLLAMA_API_BASE}/api/chat"
 
-        if json_mode:
-            payload["format"] = "json"
+        payload = build_ollama_payload(
+            user_prompt=user_prompt,
+            system_prompt=system_prompt,
+            history=history,
+            model=model,
+            base64_image=base64_image,
+            json_mode=json_mode,
+        )
+        if payload is None:
+            return "Error: No messages provided"
 
-        response = requests.post(url, json=payload, timeout=90)
-        response.raise_for_status()
+        body = json.dumps(payload).encode()
+        try:
+            response = requests.post(url, data=body, headers=JSON_HEADERS, timeout=90)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            record_ollama_call(stage, {}, len(body), 0, failed=True)
+            raise
+        record_ollama_call(stage, data, len(body), len(response.content))
 
         # Return the actual content
-        data = response.json()
         if "message" in data and "content" in data["message"]:
             return data["message"]["content"]
         elif "content" in data:
@@ -98,7 +275,9 @@ def call_ollama(
         return f"Error: {str(e)}"
 
 
-def generate_image(base64_image: str, prompt: str) -> str:
+def generate_image(
+    base64_image: str, prompt: str, mime_type: str = "image/jpeg", model: str = None
+) -> str:
     """
     Input:
         base64_image: Base64-encoded image data (string)
@@ -107,13 +286,17 @@ def generate_image(base64_image: str, prompt: str) -> str:
     Args:
         base64_image: Base64-encoded image data
         prompt: Text describing how to modify the image
+        mime_type: MIME type of the input image (sniffed from its content)
+        model: Gemini image model, GEMINI_IMAGE_MODEL by default
 
     Returns:
         Base64-encoded PNG data
     """
-    print(f"Generating image for prompt: {prompt}")
+    logger.debug("Generating image for prompt: %s", prompt, extra=SAMPLED)
+    import requests
+    from settings import GEMINI_API_BASE, GEMINI_IMAGE_MODEL
     API_KEY = os.getenv("GOOGLE_API")
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-image:generateContent?key={API_KEY}"
+    url = f"{GEMINI_API_BASE}/v1beta/models/{model or GEMINI_IMAGE_MODEL}:generateContent?key={API_KEY}"
 
     payload = {
         "contents": [
@@ -142,64 +325,300 @@ def generate_image(base64_image: str, prompt: str) -> str:
                 "role": "user",
                 "parts": [
                     {"text": f"Here are the intructions: {prompt}"},
-                    {"inline_data": {"mime_type": "image/jpeg", "data": base64_image}},
+                    {"inline_data": {"mime_type": mime_type, "data": base64_image}},
                 ],
             },
         ]
     }
 
+    body = json.dumps(payload).encode()
+    response = None
+    b64_output = None
     try:
-        response = requests.post(
-            url, headers={"Content-Type": "application/json"}, data=json.dumps(payload)
-        )
+        response = requests.post(url, headers=JSON_HEADERS, data=body)
+        b64_output = image_from_response(response)
+    except Exception as e:
+        logger.error(f"Unexpected error in image generation: {e}")
+
+    # Gemini bills the edits that return an image
+    accounting.record(
+        "edit",
+        calls=1,
+        edits=int(b64_output is not None),
+        errors=int(b64_output is None),
+        bytes_sent=len(body),
+        bytes_received=len(response.content) if response is not None else 0,
+    )
+    return b64_output
+
+
+def image_from_response(response) -> Optional[str]:
+    """The base64 image of a generateContent requests.Response, None (logged) if it has none"""
+    if response.status_code != 200:
+        logger.error(f"API request failed with status {response.status_code}: {response.text}")
+        return None
+
+    response_data = response.json()
+    
+    # Check if the response has the expected structure
+    if "candidates" not in response_data:
+        logger.warning(f"Unexpected API response structure: {response_data}")
+        return None
         
-        if response.status_code != 200:
-            print(f"API request failed with status {response.status_code}: {response.text}")
-            return None
-            
-        response_data = response.json()
+    if not response_data["candidates"]:
+        logger.warning("No candidates in API response")
+        return None
         
-        # Check if the response has the expected structure
-        if "candidates" not in response_data:
-            print(f"Unexpected API response structure: {response_data}")
-            return None
-            
-        if not response_data["candidates"]:
-            print("No candidates in API response")
-            return None
-            
-        candidate = response_data["candidates"][0]
+    candidate = response_data["candidates"][0]
+    
+    if "content" not in candidate:
+        logger.warning(f"No content in candidate: {candidate}")
+        return None
         
-        if "content" not in candidate:
-            print(f"No content in candidate: {candidate}")
-            return None
-            
-        if "parts" not in candidate["content"]:
-            print(f"No parts in content: {candidate['content']}")
-            return None
-            
-        parts = candidate["content"]["parts"]
-
-        for part in parts:
-            if "inlineData" in part:
-                b64_output = part["inlineData"]["data"]
-                try:
-                    base64.b64decode(b64_output, validate=True)
-                    return b64_output
-                except binascii.Error:
-                    print("Invalid base64 data detected.")
-                    return None
-
-        print("No inline data found in response parts")
+    if "parts" not in candidate["content"]:
+        logger.warning(f"No parts in content: {candidate['content']}")
         return None
+        
+    parts = candidate["content"]["parts"]
 
-    except Exception as e:
-        print(f"Unexpected error in image generation: {e}")
+    for part in parts:
+        if "inlineData" in part:
+            b64_output = part["inlineData"]["data"]
+            try:
+                base64.b64decode(b64_output, validate=True)
+                return b64_output
+            except binascii.Error:
+                logger.warning("Invalid base64 data detected.")
+                return None
+
+    logger.warning("No inline data found in response parts")
+    return None
+
+
+def stage_image(
+    image: RequestImage, tier: QualityTier, controller: ResolutionController
+) -> Tuple[RequestImage, Optional[ResolutionController]]:
+    """
+    The photo as sent to one upstream stage: capped by the quality tier and,
+    for adaptive tiers, by the stage's latency controller (see core.adaptive).
+    Also returns the controller to report the call's latency to, or None when
+    its setting didn't decide the size.
+    """
+    if not tier.adaptive or not controller.enabled:
+        return image.downscaled(tier.max_image_side), None
+    side, quality = controller.settings(tier.max_image_side)
+    decides = not tier.max_image_side or tier.max_image_side >= controller.side
+    return image.downscaled(side, quality), (controller if decides else None)
+
+
+INTENT_LABELS = ("FASHION_REQUEST", "OUT_OF_TOPIC")
+
+
+def parse_intent(response: str) -> Optional[str]:
+    """The single intent label (or UNSURE) in a Gemma answer, None if there is none"""
+    text = str(response).strip().upper()
+    if text.startswith("ERROR:"):
+        return None
+    found = [label for label in INTENT_LABELS + ("UNSURE",) if label in text]
+    return found[0] if len(found) == 1 else None
+
+
+def classify_texts(user_inputs: List[str], model: str) -> List[Optional[str]]:
+    """
+    Text-only intent labels of several requests in one Gemma call. A single
+    request uses the regular prompt, and requests the batch answer gives no
+    usable label for are retried on their own before None marks them for the
+    image pass.
+    """
+    if len(user_inputs) == 1:
+        return [
+            parse_intent(
+                call_ollama(
+                    system_prompt=TEXT_INTENT_SYSTEM_PROMPT,
+                    user_prompt=render_intent_prompt(user_inputs[0]),
+                    model=model,
+                    stage="intent",
+                )
+            )
+        ]
+
+    response = call_ollama(
+        system_prompt=BATCH_INTENT_SYSTEM_PROMPT,
+        user_prompt=render_batch_intent_prompt(user_inputs),
+        model=model,
+        json_mode=True,
+        stage="intent",
+    )
+    try:
+        labels = json.loads(response)["labels"]
+        if len(labels) != len(user_inputs):
+            raise ValueError(f"{len(labels)} labels")
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Unusable batch intent answer for {len(user_inputs)} requests: {e}")
+        labels = [None] * len(user_inputs)
+    parsed = [parse_intent(label) if isinstance(label, str) else None for label in labels]
+    # Retry text-only one by one before escalating to the (costlier) image pass
+    return [
+        label or classify_texts([user_input], model)[0]
+        for label, user_input in zip(parsed, user_inputs)
+    ]
+
+
+def classify_texts_accounted(
+    user_inputs: List[str], model: str
+) -> List[Tuple[Optional[str], accounting.RequestUsage]]:
+    """
+    classify_texts for the micro-batcher: each label comes with its request's
+    share of the call's usage, as the call itself is made by only one of them
+    """
+    with accounting.capture() as usage:
+        labels = classify_texts(user_inputs, model)
+    share = accounting.RequestUsage()
+    share.merge(usage, 1 / len(user_inputs))
+    return [(label, share) for label in labels]
+
+
+# One micro-batcher per Gemma model, created on first use
+intent_batchers: Dict[str, MicroBatcher] = {}
+_intent_batchers_lock = threading.Lock()
+
+
+def text_intent(user_input: str, model: str) -> Optional[str]:
+    """Text-only intent label, batched with concurrent requests for the same model"""
+    if INTENT_BATCH_WINDOW_MS <= 0:
+        return classify_texts([user_input], model)[0]
+    with _intent_batchers_lock:
+        batcher = intent_batchers.get(model)
+        if batcher is None:
+            batcher = intent_batchers[model] = MicroBatcher(
+                lambda user_inputs: classify_texts_accounted(user_inputs, model),
+                INTENT_BATCH_WINDOW_MS / 1000,
+                INTENT_BATCH_MAX_SIZE,
+            )
+    try:
+        label, usage = batcher.submit(user_input)
+    except Exception:
+        # Logged by the batcher; the image pass decides instead
         return None
+    accounting.record_usage(usage)
+    return label
+
+
+def classify_intent(
+    user_input: str, image: RequestImage, tier: QualityTier, mode: str = INTENT_MODE
+) -> Tuple[str, str]:
+    """
+    Classify the request as FASHION_REQUEST or OUT_OF_TOPIC.
+
+    In "two-tier" mode Gemma first sees the text alone (batched with
+    concurrent requests, see text_intent), which settles most requests
+    without the slow multimodal prompt processing; only when it
+    answers UNSURE (or nothing usable) is the call repeated with the photo,
+    downscaled to INTENT_IMAGE_MAX_SIDE. In "image" mode the photo is always
+    attached. Returns (label, "text" or "image"); the label is Gemma's raw
+    answer if the image pass gives no valid one.
+    """
+    if mode == "two-tier":
+        label = text_intent(user_input, tier.text_model)
+        if label in INTENT_LABELS:
+            return label, "text"
+        logger.info("Intent unclear from the text, attaching the photo")
+        max_side = min(tier.max_image_side or INTENT_IMAGE_MAX_SIDE, INTENT_IMAGE_MAX_SIDE)
+        tier = tier._replace(max_image_side=max_side)
+
+    intent_image, latency = stage_image(image, tier, intent_resolution)
+    start = time.perf_counter()
+    response = call_ollama(
+        system_prompt=INTENT_SYSTEM_PROMPT,
+        user_prompt=render_intent_prompt(user_input),
+        base64_image=intent_image.base64,  # Send the image for context
+        model=tier.text_model,
+        stage="intent",
+    )
+    if latency and not str(response).startswith("Error:"):
+        latency.record(time.perf_counter() - start)
+    label = parse_intent(response)
+    return (label if label in INTENT_LABELS else str(response).strip().upper()), "image"
+
+
+def generate_outfit_image(
+    image: RequestImage,
+    prompt: str,
+    image_key: str = None,
+    variant: int = 0,
+    tier: QualityTier = None,
+    latency: ResolutionController = None,
+) -> Dict[str, Any]:
+    """
+    Generate one outfit edit, encode its full-size and thumbnail variants and
+    keep the full-size one in the image store for on-demand download.
+    image_key identifies the photo in the cache (see core.dedup); it
+    defaults to the photo's own digest. A non-zero variant asks for another
+    take on the same photo and prompt instead of the cached one. The quality
+    tier picks the Gemini model and the output compression; `image` is
+    expected to be downscaled for the edit stage already (see stage_image),
+    and the edit latency is reported to `latency` if given.
+    Runs in a worker thread, so the encoding stays off the event loop.
+    Returns None when the image could not be generated.
+    """
+    from core.image_codec import create_variants
+    from settings import (
+        OUTPUT_IMAGE_FORMAT,
+        THUMBNAIL_QUALITY,
+        THUMBNAIL_SIZE,
+    )
+
+    tier = tier or get_tier()
+    # The same photo and prompt give the same edit: reuse it across restarts.
+    # The input size and JPEG quality are part of it, so an edit of a photo
+    # degraded under load is never served for a full-resolution request.
+    key = cache_key(
+        "outfit-image",
+        tier.image_model,
+        image_key or image.digest,
+        prompt,
+        *([f"input-{image.encoding[0]}-q{image.encoding[1]}"] if image.encoding else []),
+        *([str(variant)] if variant else []),
+    )
+    cached = disk_cache.get(key) if disk_cache else None
+    if cached:
+        accounting.record_cache_hit("edit")
+        data = cached[0]
+    else:
+        with gemini_slots:
+            start = time.perf_counter()
+            img_b64 = generate_image(image.base64, prompt, image.mime_type, tier.image_model)
+            if img_b64 and latency:
+                latency.record(time.perf_counter() - start)
+        if not img_b64:
+            return None
+        data = base64.b64decode(img_b64)
+        if disk_cache:
+            disk_cache.put(key, data)
+
+    variants = create_variants(
+        data,
+        OUTPUT_IMAGE_FORMAT,
+        tier.output_quality,
+        THUMBNAIL_SIZE,
+        THUMBNAIL_QUALITY,
+    )
+    image_id = image_store.put(variants["data"], variants["mime_type"])
+    return {
+        "prompt": prompt,
+        "image_id": image_id,
+        "image_base64": base64.b64encode(variants["data"]).decode(),
+        "mime_type": variants["mime_type"],
+        "thumbnail_base64": base64.b64encode(variants["thumbnail"]).decode(),
+        "thumbnail_mime_type": variants["thumbnail_mime_type"],
+    }
 
 
 def create_placeholder_images(prompts):
     """Create placeholder images when the API fails"""
+    import io
+    from PIL import Image, ImageDraw, ImageFont
+
     placeholder_images = []
     
     for i, prompt in enumerate(prompts, 1):
@@ -230,9 +649,9 @@ def create_placeholder_images(prompts):
             })
             
         except Exception as e:
-            print(f"Failed to create placeholder image {i}: {e}")
+            logger.warning(f"Failed to create placeholder image {i}: {e}")
             # Create a simple colored rectangle as fallback
-            img = Image.new('RGB', (400, 600), color=('red', 'blue', 'green', 'purple')[i-1])
+            img = Image.new('RGB', (400, 600), color=('red', 'blue', 'green', 'purple')[(i - 1) % 4])
             buffered = io.BytesIO()
             img.save(buffered, format="PNG")
             img_base64 = base64.b64encode(buffered.getvalue()).decode()
@@ -253,61 +672,87 @@ class FashionWorkflow:
         pass
 
     async def process_request(
-        self, base64_image: str, user_input: str
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfit_count: int = DEFAULT_OUTFIT_COUNT,
+        quality: str = DEFAULT_QUALITY,
+        image_key: str = None,
+    ) -> Dict[str, Any]:
+        """Run the workflow in a worker thread so the event loop keeps serving"""
+        return await asyncio.to_thread(
+            self.run, image, user_input, outfit_count, quality, image_key
+        )
+
+    async def process_follow_up(
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfits: List[Dict[str, Any]],
+        history: list,
+        quality: str = DEFAULT_QUALITY,
+        image_key: str = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Follow-up on the current outfits of a session, in a worker thread"""
+        return await asyncio.to_thread(
+            self.follow_up, image, user_input, outfits, history, quality, image_key
+        )
+
+    async def process_regenerate(
+        self,
+        image: Union[RequestImage, str],
+        outfits: List[Dict[str, Any]],
+        index: int,
+        prompt: str = None,
+        image_key: str = None,
+        quality: str = DEFAULT_QUALITY,
+    ) -> Dict[str, Any]:
+        """Re-roll one outfit of a session, in a worker thread"""
+        return await asyncio.to_thread(
+            self.regenerate, image, outfits, index, prompt, image_key, quality
+        )
+
+    def run(
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfit_count: int = DEFAULT_OUTFIT_COUNT,
+        quality: str = DEFAULT_QUALITY,
+        image_key: str = None,
     ) -> Dict[str, Any]:
-        """Process fashion request with intent classification and conditional outfit generation"""
-        print(f"Processing request: {user_input[:50]}...")
+        """
+        Process fashion request with intent classification and conditional outfit generation.
+        Generates outfit_count outfits in parallel; the quality tier picks the
+        models and the resolution of the photo sent upstream. image_key is the
+        photo's cache identity (see core.dedup), looked up here if not given.
+        """
+        logger.info(f"Processing request: {user_input[:50]}...")
 
         try:
+            tier = get_tier(quality)
+            image = RequestImage.coerce(image)
+            # Near-duplicate frames share cached edits
+            image_key = image_key or near_duplicates.canonical_digest(image)
+            # The photo as sent to the edit stage; smaller under load
+            edit_image, edit_latency = stage_image(image, tier, edit_resolution)
+
             # Step 1: Intent Classification
-            print("Classifying intent...")
-            intent_prompt = f"""
-            Figure out what the user is asking for.
-
-            Return EXACTLY one label on a single line with no punctuation or quotes:
-            FASHION_REQUEST or OUT_OF_TOPIC
-
-            Guidelines:
-            - FASHION_REQUEST = outfits, clothing styling, wardrobe advice, or garment changes to the person in the image.
-            - OUT_OF_TOPIC = makeup/hair/face/body edits, background-only edits, or unrelated/unclear text.
-            - If uncertain, choose OUT_OF_TOPIC.
-
-            Image provided: YES
-
-            Few-shot examples:
-            Q: "Make two streetwear looks I could wear with this pic"
-            A: FASHION_REQUEST
-            Q: "Can you whiten my teeth?"
-            A: OUT_OF_TOPIC
-            Q: "Put me on a beach"
-            A: OUT_OF_TOPIC
-            Q: "Suggest smart-casual outfits for the office"
-            A: FASHION_REQUEST
-
-            User input:
-            <<<{user_input}>>>
-            """
-
-            intent_response = call_ollama(
-                user_prompt=intent_prompt,
-                base64_image=base64_image,  # Send the image for context
-            )
-            intent_classification = str(intent_response).strip().upper()
-            print(f"Intent: {intent_classification}")
+            logger.debug("Classifying intent...")
+            intent_classification, intent_pass = classify_intent(user_input, image, tier)
+            logger.info(f"Intent: {intent_classification} (from the {intent_pass})")
 
             # Handle API failures gracefully
             if "Error:" in intent_classification or "error" in intent_classification.lower():
-                print("Ollama API failed, defaulting to FASHION_REQUEST")
+                logger.warning("Ollama API failed, defaulting to FASHION_REQUEST")
                 intent_classification = "FASHION_REQUEST"
 
             if intent_classification == "OUT_OF_TOPIC":
-                print("Out of topic - returning redirect message")
+                logger.info("Out of topic - returning redirect message")
                 out_of_topic_response = call_ollama(
-                    user_prompt=f"""
-                You are a fashion assistant, the user ask something that is not related to outfit generation or is unclear
-                ask for some clarification and say that you are only here to help with outfit generation.
-                User input: {user_input}
-                """,
+                    system_prompt=OUT_OF_TOPIC_SYSTEM_PROMPT,
+                    user_prompt=render_out_of_topic_prompt(user_input),
+                    model=tier.text_model,
+                    stage="out_of_topic",
                 )
                 return {
                     "suggestions": out_of_topic_response,
@@ -316,161 +761,174 @@ class FashionWorkflow:
                     "generated_images": [],
                 }
             if intent_classification == "FASHION_REQUEST":
-                print("Fashion request - generating outfits...")
-                # call gemma model to generate a set of prompt ( for example 2 )
-                # we will call the image_generator tool twice to generate 2 images
-                # we will return the images and the prompts
-                # Step 3a: Generate two outfit prompts using Gemma
-                print("Generating outfit prompts...")
-                generation_prompt = f"""
-                You are generating two outfit-edit prompts for an image editor.
-
-                REQUIRED OUTPUT FORMAT (exactly this shape):
-                {{
-                "outfits": [
-                    "string",
-                    "string",
-                    "string",
-                    "string"
-                ]
-                }}
-
-                Rules:
-                - Return VALID JSON only. No markdown, no comments, no extra keys, no trailing commas.
-                - The "outfits" array must contain EXACTLY 4 strings.
-
-                CONTENT RULES FOR EACH STRING:
-                - Start with: "Replace current clothing with ..."
-                - ≤ 60 words.
-                - Mention silhouette, a 3–5 color palette, main garments, fabric/texture, footwear, and 1–2 accessories.
-                - Include this clause verbatim: "keep body, face, hair, skin tone, pose, lighting, and background unchanged."
-                - No brand names, no text overlays, no camera/aspect settings.
-                - If the user gives no setting, assume a neutral studio background.
-                - Write in the same language as the User Input.
-
-                FEW-SHOT EXAMPLES (follow these patterns exactly):
-
-                Example 1:
-                {{
-                "outfits": [
-                    "Replace current clothing with a sleek streetwear look — oversized black hoodie, gray joggers, and chunky white sneakers; add a silver chain. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                    "Replace current clothing with a modern minimalist outfit — white cropped shirt, high-waisted beige trousers, and brown loafers with a thin leather belt; subtle gold jewelry. keep body, face, hair, skin tone, pose, lighting, and background unchanged."
-                ]
-                }}
-
-                Example 2:
-                {{
-                "outfits": [
-                    "Replace current clothing with a relaxed summer outfit — light blue linen shirt, white shorts, tan sandals, and a woven bracelet; breezy, casual vibe. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                    "Replace current clothing with an elegant evening style — satin black dress, silver heels, and minimalist pearl earrings; add soft fabric sheen. keep body, face, hair, skin tone, pose, lighting, and background unchanged."
-                ]
-                }}
-
-                User Input:
-                \"\"\"{user_input}\"\"\"
-                """
-
-                generation_response = call_ollama(
-                    user_prompt=generation_prompt,
-                    json_mode=True,  # Force strict JSON output
-                )
-                print("Generated prompts")
-
-                try:
-                    outfit_data = json.loads(generation_response)
-                    outfit_prompts = outfit_data.get("outfits", [])
-                except json.JSONDecodeError:
-                    # fallback if Gemma didn't return strict JSON
-                    outfit_prompts = [
-                        line.strip()
-                        for line in generation_response.split("\n")
-                        if line.strip()
-                    ][:4]
-                
-                # If API failed, use default prompts
-                if not outfit_prompts or "Error:" in str(generation_response):
-                    print("Ollama API failed for generation, using default prompts")
-                    outfit_prompts = [
-                        f"Replace current clothing with a casual outfit based on: {user_input}. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                        f"Replace current clothing with a professional outfit based on: {user_input}. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                        f"Replace current clothing with a stylish outfit based on: {user_input}. keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                        f"Replace current clothing with a trendy outfit based on: {user_input}. keep body, face, hair, skin tone, pose, lighting, and background unchanged."
-                    ]
-
-                # Step 3b: Generate images using Gemini image model concurrently
-                print("Generating images...")
+                logger.debug("Fashion request - generating outfits...")
+                # Step 3a: Generate outfit_count outfit prompts using Gemma
+                logger.debug("Generating outfit prompts...")
+                # Step 3b: Stream the outfit prompts and start each Gemini image
+                # edit as soon as its prompt is complete, while Gemma keeps writing
+                logger.debug("Generating images...")
                 generated_images = []
-
-                # Use ThreadPoolExecutor for concurrent image generation
-                with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-                    # Submit image generation tasks
-                    future_to_prompt = {
-                        executor.submit(generate_image, base64_image, prompt): (
+                parser = IncrementalOutfitParser()
+                prompts_key = cache_key(
+                    "outfit-prompts",
+                    tier.text_model,
+                    OUTFIT_SYSTEM_PROMPT,
+                    str(outfit_count),
+                    user_input,
+                )
+                cached_prompts = disk_cache.get_json(prompts_key) if disk_cache else None
+                # Prompts are only reused within a tier and text model
+                prompt_scope = f"{tier.name}:{tier.text_model}"
+                if not cached_prompts and outfit_prompt_cache:
+                    match = outfit_prompt_cache.lookup(user_input, prompt_scope)
+                    # Usable if the similar request asked for at least as many outfits
+                    if match and len(match[0]) >= outfit_count:
+                        cached_prompts, score, similar_input = match
+                        cached_prompts = cached_prompts[:outfit_count]
+                        logger.info(f"Reusing outfit prompts of '{similar_input[:50]}' (similarity {score:.2f})")
+
+                # One worker per outfit; gemini_slots bounds the edits across requests
+                with concurrent.futures.ThreadPoolExecutor(max_workers=outfit_count) as executor:
+                    future_to_prompt = {}
+
+                    def submit_outfit(prompt):
+                        i = len(future_to_prompt) + 1
+                        logger.debug(
+                            "Outfit prompt %d ready, starting image %d/%d",
+                            i,
                             i,
+                            outfit_count,
+                            extra=SAMPLED,
+                        )
+                        # The copied context carries the request's usage
+                        # (core.accounting) and id (core.logs)
+                        future = executor.submit(
+                            contextvars.copy_context().run,
+                            generate_outfit_image,
+                            edit_image,
                             prompt,
+                            image_key,
+                            0,
+                            tier,
+                            edit_latency,
                         )
-                        for i, prompt in enumerate(outfit_prompts[:4], 1)
-                    }
+                        future_to_prompt[future] = (i, prompt)
+
+                    if cached_prompts:
+                        logger.info("Using cached outfit prompts")
+                        accounting.record_cache_hit("outfit_prompts")
+                        for prompt in cached_prompts:
+                            submit_outfit(prompt)
+                    else:
+                        overshoot = False
+                        for chunk in stream_ollama(
+                            system_prompt=OUTFIT_SYSTEM_PROMPT,
+                            user_prompt=render_outfit_prompt(user_input, outfit_count),
+                            model=tier.text_model,
+                            json_mode=True,  # Force strict JSON output
+                            stage="outfit_prompts",
+                        ):
+                            for prompt in parser.feed(chunk):
+                                reason = validate_outfit_prompt(prompt)
+                                if reason:
+                                    logger.info(f"Rejected outfit prompt ({reason})")
+                                elif len(future_to_prompt) < outfit_count:
+                                    submit_outfit(prompt)
+                                else:
+                                    overshoot = True
+                            # Read on to Ollama's last line, with the token counts
+                            # (core.accounting), unless Gemma writes extra outfits
+                            if overshoot:
+                                break
+                        logger.debug("Generated prompts")
+
+                    generation_response = parser.text
+                    outfit_prompts = [prompt for _, prompt in future_to_prompt.values()]
+                    # Only a full set is cached: the key promises outfit_count prompts
+                    if len(outfit_prompts) == outfit_count and not cached_prompts:
+                        if disk_cache:
+                            disk_cache.put_json(prompts_key, outfit_prompts)
+                        if outfit_prompt_cache:
+                            outfit_prompt_cache.add(user_input, outfit_prompts, prompt_scope)
+
+                    if not outfit_prompts:
+                        # Gemma didn't stream a usable array: parse the full text
+                        # tolerantly and keep only prompts that pass the content rules
+                        outfit_prompts = [
+                            prompt
+                            for prompt in parse_outfits(generation_response)
+                            if not validate_outfit_prompt(prompt)
+                        ][:outfit_count]
+
+                        # If API failed, use default prompts
+                        if not outfit_prompts or "Error:" in str(generation_response):
+                            logger.warning("Ollama API failed for generation, using default prompts")
+                            outfit_prompts = default_outfit_prompts(user_input, outfit_count)
+
+                        for prompt in outfit_prompts:
+                            submit_outfit(prompt)
+
+                    # Rejected prompts leave slots empty: fill them from the
+                    # templates so the response still has outfit_count outfits
+                    missing = default_outfit_prompts(user_input, outfit_count)[len(future_to_prompt):]
+                    if missing:
+                        logger.info(f"Filling {len(missing)} missing outfit prompts with defaults")
+                        for prompt in missing:
+                            submit_outfit(prompt)
+                        outfit_prompts = [prompt for _, prompt in future_to_prompt.values()]
 
                     # Collect results as they complete
                     for future in concurrent.futures.as_completed(future_to_prompt):
                         i, prompt = future_to_prompt[future]
-                        print(f"  Image {i}/4...")
+                        logger.debug("Image %d/%d...", i, outfit_count, extra=SAMPLED)
                         try:
-                            img_b64 = future.result()
-                            if img_b64:
-                                generated_images.append(
-                                    {"prompt": prompt, "image_base64": img_b64}
-                                )
-                                print(f"  Image {i} generated")
+                            generated = future.result()
+                            if generated:
+                                generated_images.append(generated)
+                                logger.debug("Image %d generated", i, extra=SAMPLED)
                             else:
-                                print(f"  Image {i} failed")
+                                logger.warning(f"Image {i} failed")
                         except Exception as e:
-                            print(f"  Image {i} failed with error: {e}")
+                            logger.warning(f"Image {i} failed with error: {e}")
 
-                print(f"Complete! Generated {len(generated_images)} images")
+                logger.info(f"Complete! Generated {len(generated_images)} images")
                 
                 # If no images were generated, create placeholder images
                 if not generated_images:
-                    print("No images generated, creating placeholder images...")
-                    placeholder_images = create_placeholder_images(outfit_prompts[:4])
+                    logger.warning("No images generated, creating placeholder images...")
+                    placeholder_images = create_placeholder_images(outfit_prompts)
                     generated_images = placeholder_images
                 # Step 3c: Return results
                 # another call to generate combinatining the prompts descriptions , a readable description of the image
 
-                print("Creating combined outfit description...")
-
-                try:
-                    system_prompt = (
-                        "You are a professional fashion stylist and copywriter. "
-                        "You write vivid, elegant, and concise outfit descriptions for clients. "
-                        "Focus on tone, mood, and visual coherence — not just listing items."
-                    )
-
-                    user_prompt = f"""
-                    These outfit ideas were generated for the user:
-                    {json.dumps(outfit_prompts, indent=2)}
-
-                    Write a short paragraph (3–5 sentences) that smoothly describes these outfits
-                    as if summarizing them for a fashion magazine feature. 
-                    Avoid JSON, lists, or code blocks — produce only natural language text.
-                    """
-
-                    summary_output = call_ollama(
-                        system_prompt=system_prompt,
-                        user_prompt=user_prompt,
-                        model="gemma3:12b",
-                    )
-                    print("Combined description generated successfully.")
-
-                except Exception as e:
-                    print(f"Failed to generate combined description: {e}")
-                    summary_output = "No readable description available."
-                
+                logger.debug("Creating combined outfit description...")
+
+                summary_prompt = render_summary_prompt(outfit_prompts)
+                summary_key = cache_key("summary", tier.text_model, SUMMARY_SYSTEM_PROMPT, summary_prompt)
+                summary_output = disk_cache.get_json(summary_key) if disk_cache else None
+
+                if summary_output is not None:
+                    accounting.record_cache_hit("summary")
+                else:
+                    try:
+                        summary_output = call_ollama(
+                            system_prompt=SUMMARY_SYSTEM_PROMPT,
+                            user_prompt=summary_prompt,
+                            model=tier.text_model,
+                            stage="summary",
+                        )
+                        logger.debug("Combined description generated successfully.")
+
+                    except Exception as e:
+                        logger.warning(f"Failed to generate combined description: {e}")
+                        summary_output = "No readable description available."
+
                 # If API failed, use a simple fallback description
                 if "Error:" in str(summary_output) or not summary_output.strip():
-                    print("Ollama API failed for summary, using fallback description")
-                    summary_output = f"Here are some outfit suggestions based on your request: '{user_input}'. I've generated 4 different outfit variations for you to choose from. Each outfit maintains your personal style while incorporating the elements you requested."
+                    logger.warning("Ollama API failed for summary, using fallback description")
+                    summary_output = f"Here are some outfit suggestions based on your request: '{user_input}'. I've generated {len(generated_images)} different outfit variations for you to choose from. Each outfit maintains your personal style while incorporating the elements you requested."
+                elif disk_cache and summary_output != "No readable description available.":
+                    disk_cache.put_json(summary_key, summary_output)
 
                 # Return the summary as 'suggestions'
                 return {
@@ -490,7 +948,7 @@ class FashionWorkflow:
                 }
 
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logger.exception(f"Error: {str(e)}")
             return {
                 "suggestions": "I'm sorry, I encountered an error analyzing your request. Please try again.",
                 "success": False,
@@ -499,6 +957,112 @@ class FashionWorkflow:
                 "generated_images": [],
             }
 
+    def follow_up(
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfits: List[Dict[str, Any]],
+        history: list,
+        quality: str = DEFAULT_QUALITY,
+        image_key: str = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Apply a follow-up like "make the second one more formal": one Gemma call
+        (with the session's chat history) picks and rewrites a single outfit and
+        only that one is edited again; the others are returned unchanged.
+        Returns None when the request isn't about one of the current outfits.
+        """
+        logger.info(f"Processing follow-up: {user_input[:50]}...")
+        tier = get_tier(quality)
+        image = RequestImage.coerce(image)
+
+        response = call_ollama(
+            system_prompt=FOLLOW_UP_SYSTEM_PROMPT,
+            user_prompt=render_follow_up_prompt(user_input, [o["prompt"] for o in outfits]),
+            history=history,
+            model=tier.text_model,
+            json_mode=True,
+            stage="follow_up",
+        )
+        try:
+            decision = json.loads(response)
+            index = int(decision.get("outfit", 0)) - 1
+            prompt = str(decision.get("prompt", "")).strip()
+            reply = str(decision.get("reply", "")).strip()
+        except (ValueError, TypeError, AttributeError):
+            logger.info("Follow-up answer unusable, running the full workflow")
+            return None
+
+        if not 0 <= index < len(outfits):
+            logger.info("Follow-up is not about a current outfit, running the full workflow")
+            return None
+        reason = validate_outfit_prompt(prompt)
+        if reason:
+            logger.info(f"Rejected follow-up prompt ({reason}), running the full workflow")
+            return None
+
+        logger.info(f"Regenerating outfit {index + 1}...")
+        image_key = image_key or near_duplicates.canonical_digest(image)
+        edit_image, edit_latency = stage_image(image, tier, edit_resolution)
+        generated = generate_outfit_image(edit_image, prompt, image_key, 0, tier, edit_latency)
+        if not generated:
+            return {
+                "suggestions": "I'm sorry, I couldn't update that outfit right now. Please try again.",
+                "success": False,
+                "error": "Image generation failed",
+                "intent_classification": "FOLLOW_UP",
+                "generated_images": outfits,
+            }
+
+        updated = list(outfits)
+        updated[index] = generated
+        return {
+            "suggestions": reply or f"Here is the updated outfit {index + 1}.",
+            "success": True,
+            "intent_classification": "FOLLOW_UP",
+            "generated_images": updated,
+        }
+
+    def regenerate(
+        self,
+        image: Union[RequestImage, str],
+        outfits: List[Dict[str, Any]],
+        index: int,
+        prompt: str = None,
+        image_key: str = None,
+        quality: str = DEFAULT_QUALITY,
+    ) -> Dict[str, Any]:
+        """
+        Re-roll outfit `index` with a new prompt, or as another take on its
+        current prompt. Costs one image edit and no Gemma call; the other
+        outfits are returned unchanged.
+        """
+        tier = get_tier(quality)
+        image, edit_latency = stage_image(RequestImage.coerce(image), tier, edit_resolution)
+        current = outfits[index]
+        # A new take on the same prompt must not come back from the cache
+        variant = 0 if prompt else current.get("variant", 0) + 1
+        prompt = prompt or current["prompt"]
+
+        logger.info(f"Regenerating outfit {index + 1} (variant {variant})...")
+        generated = generate_outfit_image(image, prompt, image_key, variant, tier, edit_latency)
+        if not generated:
+            return {
+                "suggestions": "I'm sorry, I couldn't regenerate that outfit right now. Please try again.",
+                "success": False,
+                "error": "Image generation failed",
+                "generated_images": outfits,
+            }
+
+        generated["variant"] = variant
+        updated = list(outfits)
+        updated[index] = generated
+        return {
+            "suggestions": f"Here is a new take on outfit {index + 1}.",
+            "success": True,
+            "generated_images": updated,
+        }
+
 
 # Global workflow instance
 fashion_workflow = FashionWorkflow()
@@ -12,20 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import os
 import base64
 import json
 import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Union
 from PIL import Image, ImageDraw, ImageFont
 import io
 import random
 
-# Setup simple logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from core.image_payload import RequestImage
+from core.prompts import DEFAULT_OUTFIT_STYLES, default_outfit_prompts
+from settings import DEFAULT_OUTFIT_COUNT
+
 logger = logging.getLogger(__name__)
 
 
@@ -115,7 +116,7 @@ def create_fashion_placeholder_images(prompts):
             })
             
         except Exception as e:
-            print(f"Failed to create fashion placeholder image {i}: {e}")
+            logger.warning(f"Failed to create fashion placeholder image {i}: {e}")
             # Create a simple colored rectangle as fallback
             img = Image.new('RGB', (400, 600), color=random.choice(['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']))
             buffered = io.BytesIO()
@@ -138,10 +139,22 @@ class FashionWorkflowFallback:
         pass
 
     async def process_request(
-        self, base64_image: str, user_input: str
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfit_count: int = DEFAULT_OUTFIT_COUNT,
+    ) -> Dict[str, Any]:
+        """Run the workflow in a worker thread so the event loop keeps serving"""
+        return await asyncio.to_thread(self.run, image, user_input, outfit_count)
+
+    def run(
+        self,
+        image: Union[RequestImage, str],
+        user_input: str,
+        outfit_count: int = DEFAULT_OUTFIT_COUNT,
     ) -> Dict[str, Any]:
         """Process fashion request using fallback methods"""
-        print(f"Processing request with fallback: {user_input[:50]}...")
+        logger.info(f"Processing request with fallback: {user_input[:50]}...")
 
         try:
             # Simple intent classification based on keywords
@@ -163,24 +176,20 @@ class FashionWorkflowFallback:
                 }
             
             # Generate outfit prompts using simple templates
-            outfit_templates = [
-                f"Replace current clothing with a casual outfit based on: {user_input}. Keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                f"Replace current clothing with a professional outfit based on: {user_input}. Keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                f"Replace current clothing with a stylish outfit based on: {user_input}. Keep body, face, hair, skin tone, pose, lighting, and background unchanged.",
-                f"Replace current clothing with a trendy outfit based on: {user_input}. Keep body, face, hair, skin tone, pose, lighting, and background unchanged."
-            ]
+            outfit_templates = default_outfit_prompts(user_input, outfit_count)
             
             # Create placeholder images
             placeholder_images = create_fashion_placeholder_images(outfit_templates)
             
             # Generate a simple description
+            styles = "\n".join(
+                f"{i}. **{style.capitalize()} Look**"
+                for i, style in enumerate(DEFAULT_OUTFIT_STYLES[:outfit_count], 1)
+            )
             suggestions = f"""Here are some outfit suggestions based on your request: "{user_input}".
 
-I've prepared 4 different outfit variations for you:
-1. **Casual Style** - Perfect for everyday wear
-2. **Professional Look** - Great for work or formal occasions  
-3. **Stylish Ensemble** - - A fashionable choice for social events
-4. **Trendy Outfit** - Following current fashion trends
+I've prepared {len(outfit_templates)} different outfit variations for you:
+{styles}
 
 Each outfit maintains your personal style while incorporating the elements you requested. The suggestions are designed to be versatile and suitable for various occasions.
 
@@ -194,7 +203,7 @@ Each outfit maintains your personal style while incorporating the elements you r
             }
 
         except Exception as e:
-            print(f"Error in fallback workflow: {str(e)}")
+            logger.exception(f"Error in fallback workflow: {str(e)}")
             return {
                 "suggestions": "I'm sorry, I encountered an error processing your request. Please try again.",
                 "success": False,
@@ -0,0 +1,85 @@
+import io
+import logging
+from typing import Any, Dict, Tuple
+
+from PIL import Image, features
+
+from core.image_payload import sniff_mime_type
+
+logger = logging.getLogger(__name__)
+
+# Output formats we can transcode generated images to
+OUTPUT_FORMATS = {
+    "WEBP": "image/webp",
+    "AVIF": "image/avif",
+    "JPEG": "image/jpeg",
+}
+
+
+def resolve_output_format(output_format: str) -> str:
+    """Normalise the configured format, falling back to WEBP when AVIF is unavailable"""
+    output_format = (output_format or "").upper()
+    if output_format == "AVIF" and not features.check("avif"):
+        logger.warning("AVIF encoding is not available in this Pillow build, using WEBP")
+        return "WEBP"
+    return output_format
+
+
+def encode_image(img: Image.Image, output_format: str, quality: int) -> bytes:
+    """Encode a PIL image in one of OUTPUT_FORMATS"""
+    if output_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buffered = io.BytesIO()
+    if output_format == "WEBP":
+        # method=4 is Pillow's default speed/size trade-off
+        img.save(buffered, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buffered, format=output_format, quality=quality)
+    return buffered.getvalue()
+
+
+def _encode_if_smaller(
+    img: Image.Image, data: bytes, output_format: str, quality: int
+) -> Tuple[bytes, str]:
+    """Encode `img`, keeping the original bytes when that would not shrink them"""
+    if output_format in OUTPUT_FORMATS:
+        try:
+            encoded = encode_image(img, output_format, quality)
+            if len(encoded) < len(data):
+                return encoded, OUTPUT_FORMATS[output_format]
+        except Exception as e:
+            logger.warning(f"Image transcoding to {output_format} failed: {e}")
+    return data, sniff_mime_type(data)
+
+
+def create_variants(
+    data: bytes,
+    output_format: str,
+    quality: int,
+    thumbnail_size: int,
+    thumbnail_quality: int,
+) -> Dict[str, Any]:
+    """
+    Decode a generated image once and encode its full-size and thumbnail variants.
+
+    Returns raw bytes and MIME types for both; the thumbnail fits in a
+    thumbnail_size square and always uses a compact format.
+    """
+    output_format = resolve_output_format(output_format)
+    thumbnail_format = output_format if output_format in OUTPUT_FORMATS else "WEBP"
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        full, mime_type = _encode_if_smaller(img, data, output_format, quality)
+
+        thumb = img.copy()
+        thumb.thumbnail((thumbnail_size, thumbnail_size))
+        thumbnail = encode_image(thumb, thumbnail_format, thumbnail_quality)
+
+    return {
+        "data": full,
+        "mime_type": mime_type,
+        "thumbnail": thumbnail,
+        "thumbnail_mime_type": OUTPUT_FORMATS[thumbnail_format],
+    }
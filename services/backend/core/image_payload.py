@@ -0,0 +1,167 @@
+import base64
+import binascii
+import hashlib
+import io
+from functools import cached_property
+from typing import Optional, Tuple, Union
+
+# Magic-byte signatures of the image formats clients send us
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+DEFAULT_MIME_TYPE = "image/jpeg"
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """Detect the image MIME type from its leading bytes"""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp":
+        brand = data[8:12]
+        if brand in (b"avif", b"avis"):
+            return "image/avif"
+        if brand in (b"heic", b"heix", b"mif1"):
+            return "image/heic"
+    return DEFAULT_MIME_TYPE
+
+
+class RequestImage:
+    """
+    Image of a single request, decoded once and shared by every workflow stage.
+
+    Holds the raw bytes and one canonical base64 encoding; the content hash,
+    perceptual hash, dimensions and MIME type are computed lazily on first use.
+    """
+
+    def __init__(self, data: bytes, base64_data: str = None):
+        self.data = data
+        self._base64 = base64_data
+        # (max side, JPEG quality) of a copy made by downscaled(), None for
+        # the photo as the client sent it
+        self.encoding: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def from_base64(cls, base64_image: str) -> "RequestImage":
+        """Decode a client-supplied base64 string (a data: URL prefix is accepted)"""
+        if base64_image.startswith("data:") and "," in base64_image:
+            base64_image = base64_image.split(",", 1)[1]
+
+        try:
+            data = base64.b64decode(base64_image)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64 image: {e}")
+        if not data:
+            raise ValueError("Empty image")
+
+        # Reuse the client's string when it already is the canonical encoding
+        # (same length means no whitespace or other ignored characters)
+        canonical = len(base64_image) == 4 * ((len(data) + 2) // 3)
+        return cls(data, base64_image if canonical else None)
+
+    @classmethod
+    def coerce(cls, image: Union["RequestImage", str]) -> "RequestImage":
+        """Accept either a RequestImage or a raw base64 string"""
+        if isinstance(image, cls):
+            return image
+        return cls.from_base64(image)
+
+    @property
+    def base64(self) -> str:
+        """Canonical base64 encoding, encoded at most once"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode()
+        return self._base64
+
+    @cached_property
+    def digest(self) -> str:
+        """SHA-256 of the raw bytes, used as the content address of the image"""
+        return hashlib.sha256(self.data).hexdigest()
+
+    @cached_property
+    def dhash(self) -> Optional[int]:
+        """
+        64-bit difference hash: one bit per horizontally adjacent pixel pair of
+        a 9x8 grayscale thumbnail. Re-encoded or slightly different frames of
+        the same scene differ in only a few bits. None if the image can't be decoded.
+        """
+        return self._difference_hash(8)
+
+    @cached_property
+    def fine_dhash(self) -> Optional[bytes]:
+        """
+        256-bit difference hash of a 17x16 thumbnail, as 32 bytes. Confirms a
+        dhash match: re-encodes of a photo stay within a few bits, while the
+        same person in another outfit differs in 15+ bits where the 64-bit
+        hash may not.
+        """
+        value = self._difference_hash(16)
+        return None if value is None else value.to_bytes(32, "big")
+
+    def _difference_hash(self, rows: int) -> Optional[int]:
+        from PIL import Image
+
+        try:
+            with Image.open(io.BytesIO(self.data)) as img:
+                # Let the JPEG decoder downscale while decoding
+                img.draft("L", (8 * rows, 8 * rows))
+                thumbnail = img.convert("L").resize((rows + 1, rows), Image.Resampling.BOX)
+                pixels = list(thumbnail.getdata())
+        except (OSError, ValueError):
+            return None
+
+        value = 0
+        for row in range(rows):
+            for col in range(rows):
+                left, right = pixels[row * (rows + 1) + col], pixels[row * (rows + 1) + col + 1]
+                value = (value << 1) | (left > right)
+        return value
+
+    @cached_property
+    def mime_type(self) -> str:
+        return sniff_mime_type(self.data)
+
+    @cached_property
+    def size(self) -> Tuple[int, int]:
+        """
+        (width, height), read from the image header without decoding pixels.
+        Raises ValueError when the bytes aren't an image PIL can open.
+        """
+        from PIL import Image
+
+        try:
+            with Image.open(io.BytesIO(self.data)) as img:
+                return img.size
+        except OSError:
+            raise ValueError("Not a supported image")
+
+    def downscaled(self, max_side: int, quality: int = 90) -> "RequestImage":
+        """
+        Copy whose longer side is at most max_side, re-encoded as JPEG; the
+        image itself when it is already small enough (or max_side is 0).
+        Smaller uploads make the multimodal Gemma and Gemini calls faster.
+        """
+        from PIL import Image
+
+        if not max_side or max(self.size) <= max_side:
+            return self
+        with Image.open(io.BytesIO(self.data)) as img:
+            img.draft("RGB", (max_side, max_side))
+            img = img.convert("RGB")
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality)
+        resized = RequestImage(buffer.getvalue())
+        resized.encoding = (max_side, quality)
+        return resized
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"RequestImage({self.mime_type}, {len(self.data)} bytes)"
@@ -0,0 +1,38 @@
+import hashlib
+from typing import Optional, Tuple
+
+from core.state import StateBackend, state_backend
+from settings import IMAGE_STORE_TTL
+
+
+class ImageStore:
+    """
+    Store for full-resolution generated images.
+
+    Responses carry thumbnails and an image id; clients fetch the full image
+    from GET /images/{image_id} only when they need it. Ids are content
+    hashes, so the same image always gets the same id. Images live in the
+    shared state backend, so any worker can serve them.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """Store an image and return its id"""
+        image_id = hashlib.sha256(data).hexdigest()[:32]
+        self.backend.set(f"image:{image_id}", mime_type.encode() + b"\n" + data, self.ttl)
+        return image_id
+
+    def get(self, image_id: str) -> Optional[Tuple[bytes, str]]:
+        """Return (bytes, MIME type) or None if unknown or expired"""
+        value = self.backend.get(f"image:{image_id}")
+        if value is None:
+            return None
+        mime_type, data = value.split(b"\n", 1)
+        return data, mime_type.decode()
+
+
+# Global image store instance
+image_store = ImageStore(state_backend, IMAGE_STORE_TTL)
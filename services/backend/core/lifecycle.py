@@ -0,0 +1,37 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class InflightTracker:
+    """Counts running fashion jobs so shutdown can wait for them to finish"""
+
+    def __init__(self):
+        self.count = 0
+        self.draining = False
+
+    @asynccontextmanager
+    async def track(self):
+        self.count += 1
+        try:
+            yield
+        finally:
+            self.count -= 1
+
+    async def drain(self, timeout: float):
+        """Wait until no job is running or the timeout expires"""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        if self.count:
+            logger.info(f"Draining {self.count} in-flight job(s)...")
+        while self.count and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.count:
+            logger.warning(f"Shutdown timeout reached with {self.count} job(s) still running")
+
+
+# Global in-flight job tracker
+inflight_jobs = InflightTracker()
@@ -0,0 +1,205 @@
+"""
+Structured logging kept off the request path.
+
+configure_logging() gives the root logger a single QueueHandler: the event
+loop and the workflow threads only put records on a queue, and a
+QueueListener thread formats them (JSON lines or text) and writes them to
+stdout. uvicorn's loggers are routed through the same queue.
+
+Every record carries the id of the request it belongs to: RequestIdMiddleware
+sets it for HTTP requests (from X-Request-ID, or a new one, echoed in the
+response) and the batch runner for batch items. High-volume lines, like the
+per-image progress of the workflow, are logged with extra=SAMPLED and kept
+for LOG_SAMPLE_RATE of the requests; the choice is made per request id, so a
+sampled request keeps all of its lines.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+from settings import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# extra= of lines that are only kept for the sampled requests
+SAMPLED = {"sampled": True}
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+VALID_REQUEST_ID = re.compile(r"[\w.:-]{1,64}")
+# Loggers of the backend itself; libraries log at INFO and above whatever LOG_LEVEL is
+APP_LOGGERS = ("core", "api", "batch", "__main__")
+
+_listeners: List[QueueListener] = []
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request id to records and drops unsampled SAMPLED lines"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs in the calling thread, where the request's context is current
+        record.request_id = request_id.get()
+        if getattr(record, "sampled", False):
+            return self.sampled(record.request_id)
+        return True
+
+    def sampled(self, rid: Optional[str]) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        if rid is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(rid.encode()) % 10_000 < self.sample_rate * 10_000
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    Puts records on the queue with their message already rendered (the
+    arguments may change once the call returns), leaving the formatting to
+    the listener thread
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra= fields of the call are included"""
+
+    STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+        "message",
+        "asctime",
+        "request_id",
+        "sampled",
+        "color_message",
+    }
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in self.STANDARD:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic format, with the request id in front of the message"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        rid = getattr(record, "request_id", None)
+        if rid:
+            prefix = f" - {record.name} - "
+            line = line.replace(prefix, f"{prefix}[{rid}] ", 1)
+        return line
+
+
+def queued(handler: logging.Handler) -> QueueHandler:
+    """A handler that hands records to `handler` on a background thread"""
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return RecordQueueHandler(records)
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    sample_rate: float = LOG_SAMPLE_RATE,
+    stream=None,
+):
+    """Route all logging through one queue to a stdout writer thread"""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+    queue_handler = queued(handler)
+    queue_handler.addFilter(RequestContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+        # Configured before: stop the previous writer thread
+        for listener in [l for l in _listeners if l.queue is getattr(old, "queue", None)]:
+            listener.stop()
+            _listeners.remove(listener)
+    root.addHandler(queue_handler)
+    root.setLevel(max(logging.getLevelName(level), logging.INFO))
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    # uvicorn configures its own handlers before importing the app
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers.clear()
+        logger.propagate = True
+
+
+def stop_logging():
+    """Write out the queued records and stop the writer threads"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_logging)
+
+
+class RequestIdMiddleware:
+    """ASGI middleware giving every HTTP request an id for its log lines and response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        if not VALID_REQUEST_ID.fullmatch(rid):
+            rid = new_request_id()
+        header = (b"x-request-id", rid.encode())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
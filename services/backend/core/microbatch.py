@@ -0,0 +1,86 @@
+"""
+Micro-batching of small upstream calls made by concurrent requests.
+
+Callers submit one item each from their worker threads. Items arriving
+within `window` seconds of the first one are handed to `fn` together, as
+one list, and every caller gets back its own element of the result list.
+A batch is sent early once it reaches `max_size` items.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], window: float, max_size: int):
+        self.fn = fn
+        self.window = window
+        self.max_size = max_size
+        self._pending: List[Tuple[Any, Future]] = []
+        self._timer = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item: Any) -> Any:
+        """Result for `item`, once the batch it joined has been processed"""
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) >= self.max_size:
+                # Full: the caller that filled it sends it right away
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._run(batch)
+        return future.result()
+
+    def _take(self) -> List[Tuple[Any, Future]]:
+        """Pop the next batch; called with the lock held"""
+        batch, self._pending = self._pending[: self.max_size], self._pending[self.max_size :]
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            # Left over from a full batch: they get a window of their own
+            self._timer = threading.Timer(self.window, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            batch = self._take() if self._pending else None
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch: List[Tuple[Any, Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = self.fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"{len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else None,
+        }
@@ -0,0 +1,143 @@
+import json
+import re
+from typing import List, Optional
+
+# Matches the start of the outfits array in Gemma's JSON output
+OUTFITS_ARRAY_PATTERN = re.compile(r'"outfits"\s*:\s*\[')
+# Fallback when the model drops the key and returns a bare array
+ANY_ARRAY_PATTERN = re.compile(r"\[")
+CODE_FENCE_PATTERN = re.compile(r"```(?:json)?", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Content rules the outfit-generation prompt asks Gemma to follow
+OUTFIT_PREFIX = "replace current clothing"
+OUTFIT_MAX_WORDS = 60
+PRESERVATION_CLAUSE = (
+    "keep body, face, hair, skin tone, pose, lighting, and background unchanged"
+)
+
+_SEEK_ARRAY = 0
+_IN_ARRAY = 1
+_IN_STRING = 2
+_DONE = 3
+
+
+class IncrementalOutfitParser:
+    """
+    Incremental parser for the `outfits` array of a streamed JSON document.
+
+    Text chunks are fed as they arrive from the model and every outfit string
+    is returned as soon as its closing quote has been seen, so the caller can
+    start working on it while the rest of the document is still being written.
+    """
+
+    def __init__(self, array_pattern: re.Pattern = OUTFITS_ARRAY_PATTERN):
+        self._array_pattern = array_pattern
+        self._buffer = ""
+        self._pos = 0
+        self._state = _SEEK_ARRAY
+        self._string_start = 0
+        self._escaped = False
+        self.outfits: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Full text received so far"""
+        return self._buffer
+
+    @property
+    def done(self) -> bool:
+        """True once the closing bracket of the outfits array was seen"""
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk of model output and return newly completed outfits"""
+        self._buffer += chunk
+        completed = []
+
+        while self._pos < len(self._buffer) and self._state != _DONE:
+            if self._state == _SEEK_ARRAY:
+                # The preamble before the array is tiny, so rescanning it is cheap
+                # and handles a key split across chunks
+                match = self._array_pattern.search(self._buffer)
+                if not match:
+                    break
+                self._pos = match.end()
+                self._state = _IN_ARRAY
+
+            elif self._state == _IN_ARRAY:
+                char = self._buffer[self._pos]
+                self._pos += 1
+                if char == '"':
+                    self._state = _IN_STRING
+                    self._string_start = self._pos
+                    self._escaped = False
+                elif char == "]":
+                    self._state = _DONE
+
+            elif self._state == _IN_STRING:
+                char = self._buffer[self._pos]
+                self._pos += 1
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    raw = self._buffer[self._string_start : self._pos - 1]
+                    outfit = _decode_json_string(raw)
+                    if outfit:
+                        self.outfits.append(outfit)
+                        completed.append(outfit)
+                    self._state = _IN_ARRAY
+
+        return completed
+
+
+def _decode_json_string(raw: str) -> str:
+    """Decode the body of a JSON string literal, tolerating bad escapes"""
+    try:
+        return json.loads(f'"{raw}"').strip()
+    except json.JSONDecodeError:
+        return raw.replace('\\"', '"').strip()
+
+
+def parse_outfits(text: str) -> List[str]:
+    """
+    Extract outfit strings from Gemma output that may not be strict JSON.
+    Handles markdown fences, a missing "outfits" key, trailing commas and
+    truncated output (an unterminated last string is dropped).
+    """
+    if not text:
+        return []
+
+    text = CODE_FENCE_PATTERN.sub("", text)
+
+    for pattern in (OUTFITS_ARRAY_PATTERN, ANY_ARRAY_PATTERN):
+        parser = IncrementalOutfitParser(array_pattern=pattern)
+        parser.feed(text)
+        if parser.outfits:
+            return parser.outfits
+
+    # Plain-text answer: keep only lines that look like outfit prompts
+    return [
+        line.strip(" \t-*\"',")
+        for line in text.splitlines()
+        if line.strip(" \t-*\"',").lower().startswith(OUTFIT_PREFIX)
+    ]
+
+
+def validate_outfit_prompt(prompt: str) -> Optional[str]:
+    """Return why an outfit prompt breaks the content rules, or None if it is valid"""
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "empty prompt"
+
+    normalized = WHITESPACE_PATTERN.sub(" ", prompt).strip().lower()
+
+    if not normalized.startswith(OUTFIT_PREFIX):
+        return "missing 'Replace current clothing' prefix"
+    if len(normalized.split(" ")) > OUTFIT_MAX_WORDS:
+        return f"longer than {OUTFIT_MAX_WORDS} words"
+    if PRESERVATION_CLAUSE not in normalized:
+        return "missing preservation clause"
+    return None
+
@@ -0,0 +1,204 @@
+"""
+Sublinear near-neighbour search over 64-bit perceptual hashes.
+
+Multi-index hashing: each hash is split into max_distance + 1 chunks. Two
+hashes within max_distance bits of each other must agree exactly on at
+least one chunk (pigeonhole), so a lookup only verifies the entries sharing
+a chunk with the query instead of scanning the whole index.
+
+Entries live in two parts: a large immutable segment with one sorted array
+per chunk, searched with binary search, and a smaller append buffer that is
+scanned with vectorized XOR and popcount. When the buffer fills up both are merged, and expired or
+least recently matched entries are dropped at that point. The index is
+saved to a .npz file so it survives restarts.
+
+Each entry may also carry a finer 256-bit hash; a lookup given one only
+accepts entries whose fine hash is within max_fine_distance bits of it.
+"""
+
+import logging
+import os
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_layout(chunks: int) -> List[Tuple[int, int]]:
+    """(shift, mask) of each chunk, splitting 64 bits as evenly as possible"""
+    layout, shift = [], 0
+    for i in range(chunks):
+        width = 64 // chunks + (1 if i < 64 % chunks else 0)
+        layout.append((shift, (1 << width) - 1))
+        shift += width
+    return layout
+
+
+class PerceptualHashIndex:
+    # The buffer is merged once it reaches this size or 1/8 of the segment
+    MIN_BUFFER = 1024
+
+    def __init__(
+        self,
+        max_distance: int,
+        max_entries: int,
+        max_age: float,
+        path: str = None,
+        max_fine_distance: int = 256,
+    ):
+        self.max_distance = max_distance
+        self.max_fine_distance = max_fine_distance
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.path = path
+        self._layout = _chunk_layout(max(max_distance, 0) + 1)
+        self._set_segment(
+            np.empty(0, np.uint64),
+            np.empty((0, 32), np.uint8),
+            np.empty(0, np.float64),
+            np.empty((0, 4), np.uint64),
+        )
+        self._reset_buffer()
+        if path and os.path.exists(path):
+            self.load()
+
+    def _set_segment(
+        self, hashes: np.ndarray, digests: np.ndarray, last_seen: np.ndarray, fine: np.ndarray
+    ):
+        self._hashes = hashes
+        self._digests = digests
+        self._last_seen = last_seen
+        self._fine = fine
+        self._sorted = []
+        for shift, mask in self._layout:
+            keys = (hashes >> np.uint64(shift)) & np.uint64(mask)
+            order = np.argsort(keys, kind="stable")
+            self._sorted.append((keys[order], order))
+
+    def _reset_buffer(self):
+        capacity = max(self.MIN_BUFFER, len(self._hashes) // 8)
+        self._buffer_hashes = np.empty(capacity, np.uint64)
+        self._buffer_digests = np.empty((capacity, 32), np.uint8)
+        self._buffer_last_seen = np.empty(capacity, np.float64)
+        self._buffer_fine = np.empty((capacity, 4), np.uint64)
+        self._buffered = 0
+
+    def __len__(self) -> int:
+        return len(self._hashes) + self._buffered
+
+    def _candidates(self, dhash: int) -> np.ndarray:
+        found = []
+        for (shift, mask), (keys, order) in zip(self._layout, self._sorted):
+            # Typed key: a Python int would make NumPy convert all of `keys`
+            key = np.uint64((dhash >> shift) & mask)
+            lo = keys.searchsorted(key, "left")
+            hi = keys.searchsorted(key, "right")
+            if hi > lo:
+                found.append(order[lo:hi])
+        if not found:
+            return np.empty(0, np.intp)
+        # An entry may show up under several chunks; verifying it twice is harmless
+        return np.concatenate(found)
+
+    def nearest(self, dhash: int, fine: bytes = None) -> Optional[Tuple[str, int]]:
+        """
+        (digest, distance) of the closest entry within max_distance, or None;
+        with `fine`, entries whose fine hash is further than max_fine_distance don't count
+        """
+        query = np.uint64(dhash)
+        fine_query = None if fine is None else np.frombuffer(fine, ">u8").astype(np.uint64)
+        best, best_distance = None, self.max_distance + 1
+
+        # (hashes, digests, last_seen, fine hashes, ids to verify) of both parts
+        parts = [
+            (self._hashes, self._digests, self._last_seen, self._fine, self._candidates(dhash)),
+            (
+                self._buffer_hashes,
+                self._buffer_digests,
+                self._buffer_last_seen,
+                self._buffer_fine,
+                np.arange(self._buffered),
+            ),
+        ]
+        for hashes, digests, last_seen, fine_hashes, ids in parts:
+            if not len(ids):
+                continue
+            distances = np.bitwise_count(hashes[ids] ^ query)
+            if fine_query is not None:
+                fine_distances = np.bitwise_count(fine_hashes[ids] ^ fine_query).sum(axis=1)
+                distances[fine_distances > self.max_fine_distance] = 64
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best, best_distance = (digests, last_seen, ids[i]), int(distances[i])
+
+        if best is None:
+            return None
+
+        digests, last_seen, i = best
+        # Matched entries count as recently used for eviction
+        last_seen[i] = time.time()
+        return digests[i].tobytes().hex(), best_distance
+
+    def add(self, dhash: int, digest: str, fine: bytes = bytes(32)):
+        i = self._buffered
+        self._buffer_hashes[i] = dhash
+        self._buffer_digests[i] = np.frombuffer(bytes.fromhex(digest), np.uint8)
+        self._buffer_fine[i] = np.frombuffer(fine, ">u8")
+        self._buffer_last_seen[i] = time.time()
+        self._buffered += 1
+        if self._buffered == len(self._buffer_hashes):
+            self.merge()
+
+    def merge(self):
+        """Fold the buffer into the segment, dropping expired and excess entries"""
+        n = self._buffered
+        hashes = np.concatenate([self._hashes, self._buffer_hashes[:n]])
+        digests = np.concatenate([self._digests, self._buffer_digests[:n]])
+        last_seen = np.concatenate([self._last_seen, self._buffer_last_seen[:n]])
+        fine = np.concatenate([self._fine, self._buffer_fine[:n]])
+
+        keep = last_seen >= time.time() - self.max_age
+        if keep.sum() > self.max_entries:
+            # Keep the most recently matched ones
+            cutoff = np.sort(last_seen[keep])[-self.max_entries]
+            keep &= last_seen >= cutoff
+        self._set_segment(hashes[keep], digests[keep], last_seen[keep], fine[keep])
+        self._reset_buffer()
+
+    def save(self):
+        """Write the index to `path` atomically"""
+        if not self.path:
+            return
+        self.merge()
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                np.savez(
+                    tmp,
+                    hashes=self._hashes,
+                    digests=self._digests,
+                    last_seen=self._last_seen,
+                    fine=self._fine,
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self):
+        try:
+            with np.load(self.path) as saved:
+                self._set_segment(
+                    saved["hashes"], saved["digests"], saved["last_seen"], saved["fine"]
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable perceptual hash index {self.path}: {e}")
+            return
+        self._reset_buffer()
+        # Apply the current age and size limits to the loaded entries
+        self.merge()
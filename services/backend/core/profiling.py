@@ -0,0 +1,41 @@
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def memory_profile(label: str, enabled: bool = True, top: int = 5):
+    """
+    Log the Python memory allocated while the block runs.
+
+    Uses tracemalloc, which is process-wide: with concurrent requests the
+    numbers include allocations of the other requests, so enable it
+    (PROFILE_MEMORY=True) when profiling one request at a time.
+    """
+    if not enabled:
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    start_current, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"[memory] {label}: peak +{(peak - start_current) / 1024:.0f} KiB, "
+            f"retained +{(current - start_current) / 1024:.0f} KiB, {elapsed:.2f}s"
+        )
+
+        stats = tracemalloc.take_snapshot().compare_to(before, "lineno")
+        for stat in stats[:top]:
+            logger.info(f"[memory]   {stat}")
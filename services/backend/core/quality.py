@@ -0,0 +1,69 @@
+"""
+Quality tiers of a fashion request.
+
+A tier picks the Gemma model for the text stages, the Gemini model for the
+edits, the largest side of the photo sent upstream and the compression of
+the returned images, so cheap previews and premium runs can share one
+deployment. The number of outfits is chosen per request independently.
+"""
+
+from typing import NamedTuple
+
+from settings import (
+    FAST_GEMMA_MODEL_NAME,
+    FAST_MAX_IMAGE_SIDE,
+    FAST_OUTPUT_IMAGE_QUALITY,
+    GEMINI_IMAGE_MODEL,
+    GEMMA_MODEL_NAME,
+    HIGH_GEMINI_IMAGE_MODEL,
+    HIGH_GEMMA_MODEL_NAME,
+    HIGH_OUTPUT_IMAGE_QUALITY,
+    OUTPUT_IMAGE_QUALITY,
+    STANDARD_MAX_IMAGE_SIDE,
+)
+
+
+class QualityTier(NamedTuple):
+    name: str
+    text_model: str
+    image_model: str
+    # Largest side of the photo sent to Ollama and Gemini (0 = as uploaded)
+    max_image_side: int
+    output_quality: int
+    # Whether the resolution may be lowered further under load (core.adaptive)
+    adaptive: bool
+
+
+QUALITY_TIERS = {
+    "fast": QualityTier(
+        "fast",
+        FAST_GEMMA_MODEL_NAME,
+        GEMINI_IMAGE_MODEL,
+        FAST_MAX_IMAGE_SIDE,
+        FAST_OUTPUT_IMAGE_QUALITY,
+        adaptive=True,
+    ),
+    "standard": QualityTier(
+        "standard",
+        GEMMA_MODEL_NAME,
+        GEMINI_IMAGE_MODEL,
+        STANDARD_MAX_IMAGE_SIDE,
+        OUTPUT_IMAGE_QUALITY,
+        adaptive=True,
+    ),
+    # Premium runs keep the full resolution under load
+    "high": QualityTier(
+        "high",
+        HIGH_GEMMA_MODEL_NAME,
+        HIGH_GEMINI_IMAGE_MODEL,
+        0,
+        HIGH_OUTPUT_IMAGE_QUALITY,
+        adaptive=False,
+    ),
+}
+DEFAULT_QUALITY = "standard"
+
+
+def get_tier(name: str = None) -> QualityTier:
+    """The named tier, or the standard one for unknown names"""
+    return QUALITY_TIERS.get(name or DEFAULT_QUALITY, QUALITY_TIERS[DEFAULT_QUALITY])
@@ -0,0 +1,82 @@
+"""
+Per-client token-bucket rate limiting.
+
+Each client (API key, or IP address without one) gets a bucket of `burst`
+tokens that refills at `per_minute` tokens per minute; a fashion request
+costs one token. Buckets live in the shared state backend, so the limit
+holds across worker processes.
+"""
+
+import hashlib
+import json
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from core.state import StateBackend, state_backend
+from settings import (
+    API_KEY_WEIGHTS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_MINUTE,
+    TRUST_PROXY_HEADERS,
+)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    # Seconds until the next token is available (0 when allowed)
+    retry_after: float
+
+
+class TokenBucketLimiter:
+    def __init__(self, backend: StateBackend, per_minute: float, burst: int):
+        self.backend = backend
+        self.rate = per_minute / 60
+        self.burst = burst
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+    def acquire(self, client_id: str, cost: float = 1.0) -> RateLimitResult:
+        """Take `cost` tokens from the client's bucket if it has them"""
+        if not self.enabled:
+            return RateLimitResult(True, self.burst, 0.0)
+
+        def take(current: Optional[bytes]):
+            now = time.time()
+            tokens, updated = json.loads(current) if current else (self.burst, now)
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                result = RateLimitResult(True, int(tokens), 0.0)
+            else:
+                result = RateLimitResult(False, 0, (cost - tokens) / self.rate)
+            return json.dumps([tokens, now]).encode(), result
+
+        # A bucket untouched for this long is full again and can be forgotten
+        ttl = self.burst / self.rate + 60
+        return self.backend.update(f"ratelimit:{client_id}", take, ttl)
+
+
+def identify_client(
+    headers: Dict[str, str], client_host: Optional[str]
+) -> Tuple[str, float]:
+    """
+    Return (client id, scheduling weight) for a request.
+    API keys are hashed so they never end up in the state backend or logs.
+    """
+    api_key = headers.get("x-api-key")
+    if api_key:
+        client_id = "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        return client_id, API_KEY_WEIGHTS.get(api_key, 1.0)
+
+    host = client_host or "unknown"
+    if TRUST_PROXY_HEADERS and headers.get("x-forwarded-for"):
+        # Railway and Render put the original client first
+        host = headers["x-forwarded-for"].split(",")[0].strip()
+    return f"ip:{host}", 1.0
+
+
+# Global rate limiter instance
+rate_limiter = TokenBucketLimiter(state_backend, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
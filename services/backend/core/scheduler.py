@@ -0,0 +1,98 @@
+"""
+Weighted fair queuing of fashion jobs across clients.
+
+Only `max_concurrent` jobs run at once per worker, which bounds the number
+of parallel Gemini edits. When all slots are busy, waiting jobs are started
+in order of their virtual start tag (start-time fair queuing): each client's
+jobs are spaced cost/weight apart in virtual time, so a client that submits a
+burst can't starve the others, and a client with weight 2 gets twice the
+share of one with weight 1. A job's cost is relative to a default request,
+so an eight-outfit run counts twice as much as a four-outfit one.
+"""
+
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from settings import MAX_CONCURRENT_JOBS, MAX_QUEUED_PER_CLIENT
+
+
+class QueueFullError(Exception):
+    """The client already has the maximum number of jobs waiting"""
+
+
+class FairScheduler:
+    def __init__(self, max_concurrent: int, max_queued_per_client: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued_per_client = max_queued_per_client
+        self.running = 0
+        self._queue = []
+        self._queued = Counter()
+        self._finish: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def slot(
+        self, client_id: str, weight: float = 1.0, cost: float = 1.0, queue_limit: int = None
+    ):
+        """
+        Wait for this client's turn, then hold a job slot for the block.
+        queue_limit overrides max_queued_per_client, e.g. for batch runs
+        that bound their own parallelism.
+        """
+        if self._queued[client_id] >= (queue_limit or self.max_queued_per_client):
+            raise QueueFullError(client_id)
+
+        start = max(self._vtime, self._finish.get(client_id, 0.0))
+        self._finish[client_id] = start + cost / weight
+
+        if self.running < self.max_concurrent and not self._queue:
+            self.running += 1
+            self._vtime = start
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (start, next(self._seq), waiter))
+            self._queued[client_id] += 1
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Granted a slot just as we were cancelled: hand it on
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                waiter.cancel()
+                raise
+            finally:
+                self._queued[client_id] -= 1
+                if not self._queued[client_id]:
+                    del self._queued[client_id]
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.running -= 1
+        while self._queue and self.running < self.max_concurrent:
+            start, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled():
+                continue
+            self.running += 1
+            self._vtime = start
+            waiter.set_result(None)
+
+        if not self._queue:
+            # Tags at or behind the virtual clock carry no information any more
+            self._finish = {c: f for c, f in self._finish.items() if f > self._vtime}
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+
+# Global job scheduler instance
+job_scheduler = FairScheduler(MAX_CONCURRENT_JOBS, MAX_QUEUED_PER_CLIENT)
@@ -0,0 +1,241 @@
+"""
+Semantic cache for outfit prompts.
+
+"casual outfit for work" and "something casual for the office" should not
+run two separate Gemma pipelines. Requests are embedded into unit vectors
+and compared with every cached request in one matrix-vector product; when
+the best cosine similarity reaches the threshold, that request's outfit
+prompts are reused.
+
+Embeddings come from a small sentence-transformers model (SEMANTIC_CACHE_MODEL,
+install the `semantic` extra). Without the package the cache is off: hashed
+word n-grams only match requests that share most of their words, so they
+are only used when asked for with SEMANTIC_CACHE_MODEL=hashing. Entries are
+scoped, e.g. by quality tier and text model, and only match lookups of the
+same scope.
+
+numpy is imported on first use, so it stays off the worker's start-up path.
+"""
+
+import logging
+import re
+import threading
+import zlib
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from settings import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+# Words that don't change which outfits fit a request
+STOPWORDS = {
+    "a", "an", "and", "the", "for", "to", "of", "in", "on", "at", "with", "my",
+    "me", "i", "im", "want", "need", "like", "would", "some", "something",
+    "please", "can", "you", "give", "show", "suggest", "outfit", "outfits",
+    "look", "looks", "wear", "style",
+}
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams and bigrams, no model needed"""
+
+    name = "hashing"
+    default_threshold = 0.9
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    @staticmethod
+    def _singular(word: str) -> str:
+        """Crude plural folding ("dresses" -> "dress", "shoes" -> "shoe")"""
+        if word.endswith("sses"):
+            return word[:-2]
+        if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            return word[:-1]
+        return word
+
+    def _features(self, text: str) -> List[str]:
+        words = [
+            self._singular(word)
+            for word in normalize_query(text).split()
+            if word not in STOPWORDS
+        ]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str):
+        import numpy as np
+
+        vector = np.zeros(self.dim, np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    """Small local sentence-embedding model on the CPU"""
+
+    default_threshold = 0.85
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self._model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, text: str):
+        import numpy as np
+
+        return self._model.encode(normalize_query(text), normalize_embeddings=True).astype(
+            np.float32
+        )
+
+
+def create_embedder(model_name: str):
+    """The configured model, "hashing" for HashingEmbedder; None if it can't be loaded"""
+    if model_name == HashingEmbedder.name:
+        return HashingEmbedder()
+    try:
+        return SentenceTransformerEmbedder(model_name)
+    except ImportError:
+        logger.warning("sentence-transformers not installed, semantic cache disabled")
+    except Exception as e:
+        logger.warning(f"Could not load embedding model {model_name}, semantic cache disabled: {e}")
+    return None
+
+
+class SemanticCache:
+    def __init__(self, model_name: str, threshold: Optional[float], max_entries: int):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._threshold = threshold
+        self._embedder = None
+        self._embedder_loaded = False
+        # Ring buffer of entries (numpy arrays); rows past `_size` are unused
+        self._vectors = None
+        self._scope_ids = None
+        self._scopes: Dict[str, int] = {}
+        self._queries: List[str] = []
+        self._values: List[Any] = []
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Best similarity of recent lookups, to help tune the threshold
+        self._scores = deque(maxlen=1000)
+
+    @property
+    def embedder(self):
+        # Loaded on first use: the model takes a while and runs in worker threads
+        # None when no model could be loaded: the cache then stays empty
+        with self._load_lock:
+            if not self._embedder_loaded:
+                self._embedder = create_embedder(self.model_name)
+                self._embedder_loaded = True
+        return self._embedder
+
+    @property
+    def threshold(self) -> Optional[float]:
+        embedder = self.embedder
+        return self._threshold or (embedder.default_threshold if embedder else None)
+
+    def lookup(self, query: str, scope: str = "") -> Optional[Tuple[Any, float, str]]:
+        """
+        (cached value, similarity, cached query) of the closest match of the
+        same scope above the threshold
+        """
+        import numpy as np
+
+        if self.embedder is None:
+            return None
+        vector = self.embedder.embed(query)
+        with self._lock:
+            scope_id = self._scopes.get(scope)
+            if not self._size or scope_id is None:
+                self.misses += 1
+                return None
+            similarities = self._vectors[: self._size] @ vector
+            similarities[self._scope_ids[: self._size] != scope_id] = -1.0
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+            self._scores.append(score)
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._values[best], score, self._queries[best]
+
+    def add(self, query: str, value: Any, scope: str = ""):
+        import numpy as np
+
+        if self.embedder is None:
+            return
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            # Nothing but stopwords: would match nothing meaningfully
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.empty((min(64, self.max_entries), len(vector)), np.float32)
+                self._scope_ids = np.empty(len(self._vectors), np.int32)
+            elif self._size == len(self._vectors) < self.max_entries:
+                # Grow by doubling until max_entries, then overwrite the oldest
+                capacity = min(2 * self._size, self.max_entries)
+                grown = np.empty((capacity, len(vector)), np.float32)
+                grown[: self._size] = self._vectors
+                self._vectors = grown
+                grown_ids = np.empty(capacity, np.int32)
+                grown_ids[: self._size] = self._scope_ids
+                self._scope_ids = grown_ids
+
+            i = self._next
+            self._vectors[i] = vector
+            self._scope_ids[i] = self._scopes.setdefault(scope, len(self._scopes))
+            if i == len(self._queries):
+                self._queries.append(query)
+                self._values.append(value)
+            else:
+                self._queries[i] = query
+                self._values[i] = value
+            self._size = max(self._size, i + 1)
+            self._next = (i + 1) % len(self._vectors) if self._size == self.max_entries else i + 1
+
+    def stats(self) -> Dict[str, Any]:
+        import numpy as np
+
+        lookups = self.hits + self.misses
+        scores = np.array(self._scores) if self._scores else None
+        return {
+            "embedder": self._embedder.name if self._embedder else None,
+            "threshold": self._threshold or (
+                self._embedder.default_threshold if self._embedder else None
+            ),
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "similarity_p50": float(np.percentile(scores, 50)) if scores is not None else None,
+            "similarity_p90": float(np.percentile(scores, 90)) if scores is not None else None,
+        }
+
+
+# Global semantic cache of outfit prompts (None when disabled)
+outfit_prompt_cache = (
+    SemanticCache(SEMANTIC_CACHE_MODEL, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES)
+    if SEMANTIC_CACHE_ENABLED
+    else None
+)
@@ -0,0 +1,70 @@
+import json
+import secrets
+import time
+from typing import Any, Dict, List, Optional
+
+from core.state import StateBackend, state_backend
+from core.quality import DEFAULT_QUALITY
+from settings import DEFAULT_OUTFIT_COUNT, SESSION_HISTORY_MESSAGES, SESSION_TTL
+
+
+class SessionStore:
+    """
+    Server-side state of a conversation, so follow-ups can send text only.
+
+    A session keeps the image id of the user's photo (the bytes live in the
+    image store), the canonical photo digest, the current outfits with the
+    outfit count and quality tier they were made with, and the recent Gemma
+    chat history. Sessions live in the shared state backend and
+    expire after `ttl` seconds without activity.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float, history_messages: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.history_messages = history_messages
+
+    def create(self) -> Dict[str, Any]:
+        return {
+            "id": secrets.token_urlsafe(16),
+            "image_id": None,
+            "image_key": None,
+            "outfits": [],
+            "outfit_count": DEFAULT_OUTFIT_COUNT,
+            "quality": DEFAULT_QUALITY,
+            "history": [],
+            "updated": time.time(),
+        }
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        value = self.backend.get(f"session:{session_id}")
+        return json.loads(value) if value else None
+
+    def save(self, session: Dict[str, Any]):
+        session["updated"] = time.time()
+        self.backend.set(f"session:{session['id']}", json.dumps(session).encode(), self.ttl)
+
+    def delete(self, session_id: str):
+        self.backend.delete(f"session:{session_id}")
+
+    def add_exchange(self, session: Dict[str, Any], user_input: str, reply: str):
+        """Append one user/assistant turn, keeping the most recent messages"""
+        history: List[Dict[str, str]] = session["history"]
+        history.append({"role": "user", "content": user_input})
+        history.append({"role": "assistant", "content": reply})
+        session["history"] = history[-self.history_messages :]
+
+
+def session_outfit(generated: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Outfit entry to keep in a session: the full image is dropped when it can
+    be fetched from the image store, the thumbnail is small enough to keep.
+    """
+    outfit = dict(generated)
+    if outfit.get("image_id"):
+        outfit.pop("image_base64", None)
+    return outfit
+
+
+# Global session store instance
+session_store = SessionStore(state_backend, SESSION_TTL, SESSION_HISTORY_MESSAGES)
@@ -0,0 +1,234 @@
+"""
+Pluggable key-value state shared by the API workers.
+
+Caches, rate limits and other cross-request state go through `state_backend`
+so that running several worker processes doesn't fragment them:
+
+    memory://                    in-process (single worker, the default)
+    sqlite:///path/to/state.db   shared by all workers on the same host
+    redis://host:6379/0          shared across hosts (needs the redis package)
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from settings import STATE_BACKEND, STATE_MAX_BYTES
+
+# fn(current value or None) -> (new value or None to delete, result for the caller)
+Updater = Callable[[Optional[bytes]], Tuple[Optional[bytes], object]]
+
+
+class StateBackend:
+    """Interface of a shared key-value store with per-key expiry"""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None):
+        """Atomically read-modify-write one key and return fn's result"""
+        raise NotImplementedError
+
+
+class MemoryBackend(StateBackend):
+    """In-process LRU store bounded by the total size of its values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def _get_locked(self, key: str) -> Optional[bytes]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires < time.time():
+            self._delete_locked(key)
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def _set_locked(self, key: str, value: bytes, ttl: Optional[float]):
+        self._delete_locked(key)
+        self._items[key] = (value, time.time() + ttl if ttl else None)
+        self._size += len(value)
+        while self._size > self.max_bytes and len(self._items) > 1:
+            _, (evicted, _) = self._items.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _delete_locked(self, key: str):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._size -= len(item[0])
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get_locked(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete_locked(key)
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None):
+        with self._lock:
+            value, result = fn(self._get_locked(key))
+            if value is None:
+                self._delete_locked(key)
+            else:
+                self._set_locked(key, value, ttl)
+            return result
+
+
+class SQLiteBackend(StateBackend):
+    """
+    SQLite file shared by every worker process on the host.
+    WAL mode lets readers proceed while one worker writes; updates run in
+    BEGIN IMMEDIATE transactions so read-modify-write is atomic across processes.
+    """
+
+    # Purge expired rows and enforce max_bytes every this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "expires REAL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn: sqlite3.Connection, key: str) -> Optional[bytes]:
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires >= ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, conn: sqlite3.Connection, key: str, value: bytes, ttl: Optional[float]):
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires, updated) VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl if ttl else None, now),
+        )
+
+    def _maybe_purge(self, conn: sqlite3.Connection):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY:
+            return
+        conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM kv").fetchone()[0]
+        if total > self.max_bytes:
+            # Drop the least recently written rows until we are back under the limit
+            excess = total - self.max_bytes
+            rows = conn.execute("SELECT key, LENGTH(value) FROM kv ORDER BY updated")
+            doomed = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                doomed.append((key,))
+                excess -= size
+            conn.executemany("DELETE FROM kv WHERE key = ?", doomed)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._read(self._connect(), key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        conn = self._connect()
+        self._write(conn, key, value, ttl)
+        self._maybe_purge(conn)
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value, result = fn(self._read(conn, key))
+            if value is None:
+                conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            else:
+                self._write(conn, key, value, ttl)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RedisBackend(StateBackend):
+    """Redis (or any Redis-compatible server) for state shared across hosts"""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self._redis.delete(key)
+
+    def update(self, key: str, fn: Updater, ttl: Optional[float] = None):
+        import redis
+
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    value, result = fn(pipe.get(key))
+                    pipe.multi()
+                    if value is None:
+                        pipe.delete(key)
+                    else:
+                        pipe.set(key, value, px=int(ttl * 1000) if ttl else None)
+                    pipe.execute()
+                    return result
+                except redis.WatchError:
+                    continue
+
+
+def create_backend(url: str) -> StateBackend:
+    """Create the backend described by a STATE_BACKEND url"""
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///") :], STATE_MAX_BYTES)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url in ("", "memory://"):
+        return MemoryBackend(STATE_MAX_BYTES)
+    raise ValueError(f"Unsupported STATE_BACKEND: {url}")
+
+
+# Global state backend instance
+state_backend = create_backend(STATE_BACKEND)
@@ -1,22 +1,58 @@
 #!/usr/bin/env python3
 """
 Startup script for the Vibe Fashion API server
+
+With DEBUG=True a single auto-reloading worker is started. Otherwise the
+production profile runs WEB_CONCURRENCY workers (one per CPU by default),
+sharing state through STATE_BACKEND, and drains in-flight jobs on shutdown
+(uvicorn waits for open requests, then the app for running batch items).
+DEBUG defaults to False.
 """
 
+import os
+import tempfile
+
 import uvicorn
-from settings import API_HOST, API_PORT, DEBUG
+from settings import (
+    API_HOST,
+    API_PORT,
+    DEBUG,
+    GRACEFUL_SHUTDOWN_TIMEOUT,
+    STATE_BACKEND,
+    WEB_CONCURRENCY,
+)
+
+
+def worker_count() -> int:
+    if WEB_CONCURRENCY:
+        return WEB_CONCURRENCY
+    return 1 if DEBUG else (os.cpu_count() or 1)
+
 
 if __name__ == "__main__":
+    workers = worker_count()
+
+    # Workers are separate processes: in-process state would be fragmented,
+    # so default to a SQLite file every worker on this host can share
+    if workers > 1 and STATE_BACKEND == "memory://":
+        state_path = os.path.join(tempfile.gettempdir(), "vibe-fashion-state.db")
+        os.environ["STATE_BACKEND"] = f"sqlite:///{state_path}"
+
     print("Starting Vibe Fashion API server...")
     print(f"Host: {API_HOST}")
     print(f"Port: {API_PORT}")
     print(f"Debug: {DEBUG}")
+    print(f"Workers: {workers}")
+    print(f"State backend: {os.environ.get('STATE_BACKEND', STATE_BACKEND)}")
     print("=" * 50)
 
     uvicorn.run(
         "api:app",
         host=API_HOST,
         port=API_PORT,
-        reload=DEBUG,
+        # Reloading is incompatible with multiple workers
+        reload=DEBUG and workers == 1,
+        workers=workers,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
         log_level="info" if not DEBUG else "debug",
     )
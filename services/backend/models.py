@@ -7,6 +7,11 @@ class ImageResponse(BaseModel):
 
     base64: str
     description: str
+    mime_type: str = "image/png"
+    # Full-size image is available from GET /images/{image_id}
+    image_id: Optional[str] = None
+    thumbnail_base64: Optional[str] = None
+    thumbnail_mime_type: Optional[str] = None
 
 
 class FashionResponse(BaseModel):
@@ -16,3 +21,5 @@ class FashionResponse(BaseModel):
     images: List[ImageResponse]
     success: bool = True
     error_message: Optional[str] = None
+    # Pass back on follow-ups to continue the conversation
+    session_id: Optional[str] = None
@@ -0,0 +1,18 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that serializes plain dicts in a single pass.
+
+    Endpoints returning large base64 images build the response dict themselves
+    and return this class directly, which skips FastAPI's response-model
+    validation and jsonable_encoder copies. orjson writes the strings straight
+    into the output buffer.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
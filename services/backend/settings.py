@@ -11,7 +11,46 @@ load_dotenv(dotenv_path=dotenv_path)
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 # Use PORT environment variable (common in cloud deployments) or fallback to API_PORT or 8000
 API_PORT = int(os.getenv("PORT", os.getenv("API_PORT", "8000")))
-DEBUG = os.getenv("DEBUG", "True").lower() == "true"
+# Off by default so deploys get the multi-worker production profile; set
+# DEBUG=True for a single auto-reloading worker in development
+DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+
+# Logging: "json" lines or "text", written by a background thread. LOG_LEVEL
+# applies to the backend's own loggers; per-image debug lines are kept for
+# LOG_SAMPLE_RATE of the requests (all or none of a request's lines)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if DEBUG else "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1" if DEBUG else "0.05"))
+
+# Production server: worker processes (0 = one per CPU when DEBUG is off)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+# Seconds to let in-flight fashion jobs finish on shutdown
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "120"))
+
+# Conversation sessions: idle lifetime and Gemma chat history kept per session
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_HISTORY_MESSAGES = int(os.getenv("SESSION_HISTORY_MESSAGES", "12"))
+
+# Per-client rate limit on /fashion-workflow (0 disables it)
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "6"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "3"))
+# Use the first X-Forwarded-For address as the client IP (behind a proxy)
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "False").lower() == "true"
+# Fair-queuing weights of API keys, as "key1:3,key2:0.5" (others get 1)
+API_KEY_WEIGHTS = {
+    key: float(weight)
+    for key, weight in (
+        item.rsplit(":", 1) for item in os.getenv("API_KEY_WEIGHTS", "").split(",") if item
+    )
+}
+# Fashion jobs running at once per worker, and jobs a client may have waiting
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUED_PER_CLIENT = int(os.getenv("MAX_QUEUED_PER_CLIENT", "2"))
+
+# Shared state (caches, rate limits): memory://, sqlite:///path or redis://host
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory://")
+# Size bound of the memory and sqlite backends
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(512 * 1024 * 1024)))
 
 # Google Cloud Configuration
 GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
@@ -23,7 +62,113 @@ OLLAMA_API_BASE = os.getenv(
     "OLLAMA_API_BASE", "https://ollama-153939933605.europe-west1.run.app"
 )
 GEMMA_MODEL_NAME = os.getenv("GEMMA_MODEL_NAME", "gemma3:12b")
+# How long Ollama keeps the model loaded after a request (keeps the prompt cache warm)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Fixed context window; unset keeps the server default
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0")) or None
+
+# Gemini image editing (the base URL can point at a local stub for benchmarks)
+GEMINI_API_BASE = os.getenv(
+    "GEMINI_API_BASE", "https://generativelanguage.googleapis.com"
+)
+GEMINI_IMAGE_MODEL = os.getenv("GEMINI_IMAGE_MODEL", "gemini-2.5-flash-image")
 
 # Image Processing Configuration
 MAX_IMAGE_SIZE = (1024, 1024)
 ALLOWED_IMAGE_FORMATS = ["JPEG", "PNG", "WEBP"]
+# Generated images are transcoded to this format before being returned
+# (WEBP, AVIF or JPEG; anything else returns them as generated)
+OUTPUT_IMAGE_FORMAT = os.getenv("OUTPUT_IMAGE_FORMAT", "WEBP").upper()
+OUTPUT_IMAGE_QUALITY = int(os.getenv("OUTPUT_IMAGE_QUALITY", "80"))
+# Thumbnails returned inline; full-size images are fetched from /images/{image_id}
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+IMAGE_STORE_TTL = int(os.getenv("IMAGE_STORE_TTL", "3600"))
+
+# Outfits per request when the client doesn't ask for a number (1-8)
+DEFAULT_OUTFIT_COUNT = int(os.getenv("DEFAULT_OUTFIT_COUNT", "4"))
+MAX_OUTFIT_COUNT = 8
+# Gemini edits running at once per worker, across all requests
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+# Quality tiers: "fast" previews use a small Gemma model and a downscaled
+# photo, "high" uses the largest configured models and less compression.
+# Image sides of 0 send the photo as uploaded.
+FAST_GEMMA_MODEL_NAME = os.getenv("FAST_GEMMA_MODEL_NAME", "gemma3:4b")
+FAST_MAX_IMAGE_SIDE = int(os.getenv("FAST_MAX_IMAGE_SIDE", "512"))
+FAST_OUTPUT_IMAGE_QUALITY = int(os.getenv("FAST_OUTPUT_IMAGE_QUALITY", "65"))
+STANDARD_MAX_IMAGE_SIDE = int(os.getenv("STANDARD_MAX_IMAGE_SIDE", "0"))
+HIGH_GEMMA_MODEL_NAME = os.getenv("HIGH_GEMMA_MODEL_NAME", GEMMA_MODEL_NAME)
+HIGH_GEMINI_IMAGE_MODEL = os.getenv("HIGH_GEMINI_IMAGE_MODEL", GEMINI_IMAGE_MODEL)
+HIGH_OUTPUT_IMAGE_QUALITY = int(os.getenv("HIGH_OUTPUT_IMAGE_QUALITY", "92"))
+
+# Intent classification: "two-tier" asks Gemma on the text alone and only
+# attaches the photo (at most INTENT_IMAGE_MAX_SIDE) when it is unsure;
+# "image" always sends the photo
+INTENT_MODE = os.getenv("INTENT_MODE", "two-tier")
+INTENT_IMAGE_MAX_SIDE = int(os.getenv("INTENT_IMAGE_MAX_SIDE", "448"))
+# Text-only intent calls arriving within this window are sent to Gemma as one
+# prompt of up to INTENT_BATCH_MAX_SIZE requests (0 = one call per request,
+# leaving concurrency to Ollama's parallel slots)
+INTENT_BATCH_WINDOW_MS = float(os.getenv("INTENT_BATCH_WINDOW_MS", "10"))
+INTENT_BATCH_MAX_SIZE = int(os.getenv("INTENT_BATCH_MAX_SIZE", "16"))
+
+# Adaptive input resolution (fast and standard tiers): the photo sent to the
+# intent and edit stages shrinks between these bounds when the stage's p95
+# latency (seconds) exceeds its target, and grows back when it has headroom
+# or after ADAPTIVE_IDLE_RESET seconds without calls
+ADAPTIVE_RESOLUTION = os.getenv("ADAPTIVE_RESOLUTION", "True").lower() == "true"
+ADAPTIVE_MIN_IMAGE_SIDE = int(os.getenv("ADAPTIVE_MIN_IMAGE_SIDE", "384"))
+ADAPTIVE_MAX_IMAGE_SIDE = int(os.getenv("ADAPTIVE_MAX_IMAGE_SIDE", "1536"))
+ADAPTIVE_MIN_JPEG_QUALITY = int(os.getenv("ADAPTIVE_MIN_JPEG_QUALITY", "70"))
+ADAPTIVE_MAX_JPEG_QUALITY = int(os.getenv("ADAPTIVE_MAX_JPEG_QUALITY", "90"))
+ADAPTIVE_IDLE_RESET = float(os.getenv("ADAPTIVE_IDLE_RESET", "300"))
+INTENT_TARGET_P95 = float(os.getenv("INTENT_TARGET_P95", "4"))
+EDIT_TARGET_P95 = float(os.getenv("EDIT_TARGET_P95", "20"))
+
+# Photos of the same client whose perceptual hashes differ in at most this
+# many of 64 bits, and their finer hashes in at most NEAR_DUPLICATE_FINE_DISTANCE
+# of 256, are treated as the same photo for caching and coalescing (-1 disables it)
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", "2"))
+NEAR_DUPLICATE_FINE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_FINE_DISTANCE", "8"))
+# Past photos kept in the perceptual hash index (saved next to the disk cache)
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "200000"))
+# Identical requests arriving while one runs wait for its result
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "True").lower() == "true"
+
+# Reuse outfit prompts of a similar earlier request (cosine similarity of
+# request embeddings; threshold 0 = the embedder's default). Needs the
+# `semantic` extra (sentence-transformers), else it stays off;
+# SEMANTIC_CACHE_MODEL=hashing only matches near-identical wording
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0")) or None
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+
+# Batch runs (batch.py and POST /batches): manifests and output directories
+# given to the API must be inside BATCH_DIR; items run BATCH_CONCURRENCY at a
+# time and share the job scheduler with BATCH_WEIGHT
+BATCH_DIR = os.getenv("BATCH_DIR", str(root_dir / "batches"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_WEIGHT = float(os.getenv("BATCH_WEIGHT", "0.5"))
+
+# Usage accounting: every request's upstream calls, tokens, bytes and cache
+# savings go to per-client totals in USAGE_DB_PATH (SQLite, shared by the
+# workers of a host, never evicted) and to rotating JSON-lines logs in
+# USAGE_LOG_DIR (one file per worker; empty disables them). Costs are
+# estimates from these prices (USD). GET /admin/usage needs ADMIN_API_KEY in
+# the X-Admin-Key header and is disabled when it is unset.
+GEMINI_COST_PER_EDIT = float(os.getenv("GEMINI_COST_PER_EDIT", "0.039"))
+OLLAMA_COST_PER_GPU_SECOND = float(os.getenv("OLLAMA_COST_PER_GPU_SECOND", "0.0003"))
+USAGE_LOG_DIR = os.getenv("USAGE_LOG_DIR", str(root_dir / "logs"))
+USAGE_LOG_MAX_BYTES = int(os.getenv("USAGE_LOG_MAX_BYTES", str(10 * 1024**2)))
+USAGE_LOG_BACKUPS = int(os.getenv("USAGE_LOG_BACKUPS", "5"))
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", str(root_dir / "logs" / "usage.sqlite"))
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Persistent cache for generated images and LLM outputs (empty disables it)
+DISK_CACHE_DIR = os.getenv("DISK_CACHE_DIR", str(root_dir / ".cache"))
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", str(2 * 1024**3)))
+DISK_CACHE_MAX_AGE = int(os.getenv("DISK_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Diagnostics: log a tracemalloc allocation profile for every request
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "False").lower() == "true"
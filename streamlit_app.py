@@ -135,7 +135,9 @@ with col2:
                     # Prepare the request
                     payload = {
                         "base64_image": img_base64,
-                        "user_input": user_input.strip()
+                        "user_input": user_input.strip(),
+                        # The grid shows thumbnails; full images are linked below each one
+                        "thumbnails_only": True
                     }
                     
                     # Make the API call
@@ -168,8 +170,9 @@ with col2:
                                     if i < len(cols):
                                         with cols[i % 2]:
                                             try:
-                                                # Decode base64 image
-                                                img_bytes = base64.b64decode(img_data.get("base64", ""))
+                                                # Decode base64 image (thumbnail when available)
+                                                img_b64 = img_data.get("thumbnail_base64") or img_data.get("base64", "")
+                                                img_bytes = base64.b64decode(img_b64)
                                                 img = Image.open(io.BytesIO(img_bytes))
                                                 
                                                 st.image(
@@ -177,6 +180,8 @@ with col2:
                                                     caption=img_data.get("description", f"Outfit {i+1}"),
                                                     use_column_width=True
                                                 )
+                                                if img_data.get("image_id"):
+                                                    st.markdown(f"[🔍 Full resolution]({backend_url}/images/{img_data['image_id']})")
                                             except Exception as e:
                                                 st.error(f"Error displaying image {i+1}: {str(e)}")
                             else: